@@ -1,46 +1,126 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import os
+import sys
+import logging
+from dataclasses import dataclass, asdict
 from pathlib import Path
+from types import MappingProxyType
 
-# 项目根目录
-BASE_DIR = Path(__file__).parent.absolute()
-
-# 数据库配置
-DB_CONFIG = {
-    'default_path': BASE_DIR / 'data' / 'projects',
-    'template_path': BASE_DIR / 'data' / 'templates',
-    'backup_path': BASE_DIR / 'data' / 'backups'
-}
-
-# 应用配置
-APP_CONFIG = {
-    'name': '工艺设计程序',
-    'version': '1.0.0',
-    'author': '工艺设计团队',
-    'default_units': {
-        'temperature': '°C',
-        'pressure': 'bar',
-        'flow_rate': 'kg/h',
-        'density': 'kg/m³',
-        'viscosity': 'Pa·s'
-    }
-}
+logger = logging.getLogger(__name__)
+
+# 项目根目录（字符串形式只计算一次，Path形式保留给需要路径运算的调用方）
+BASE_DIR_STR = os.path.dirname(os.fspath(Path(__file__).resolve()))
+BASE_DIR = Path(BASE_DIR_STR)
+
+# 数据库配置（预先计算好的字符串路径，只读）
+DB_CONFIG = MappingProxyType({
+    'default_path': os.path.join(BASE_DIR_STR, 'data', 'projects'),
+    'template_path': os.path.join(BASE_DIR_STR, 'data', 'templates'),
+    'backup_path': os.path.join(BASE_DIR_STR, 'data', 'backups')
+})
+
+def as_path(key: str) -> Path:
+    """以Path对象形式获取DB_CONFIG中的路径"""
+    return Path(DB_CONFIG[key])
+
+# 常用单位字符串（驻留后全局共享同一对象，可用 is 比较）
+UNIT_CELSIUS = sys.intern('°C')
+UNIT_BAR = sys.intern('bar')
+UNIT_KG_PER_H = sys.intern('kg/h')
+UNIT_KG_PER_M3 = sys.intern('kg/m³')
+UNIT_PA_S = sys.intern('Pa·s')
+
+@dataclass(frozen=True, slots=True)
+class UnitConfig:
+    """默认单位配置"""
+    temperature: str = UNIT_CELSIUS
+    pressure: str = UNIT_BAR
+    flow_rate: str = UNIT_KG_PER_H
+    density: str = UNIT_KG_PER_M3
+    viscosity: str = UNIT_PA_S
+
+@dataclass(frozen=True, slots=True)
+class AppConfig:
+    """应用配置"""
+    name: str
+    version: str
+    author: str
+    default_units: UnitConfig
+
+# 应用配置（新代码优先使用属性访问，如 APP.default_units.temperature）
+APP = AppConfig(
+    name='工艺设计程序',
+    version='1.0.0',
+    author='工艺设计团队',
+    default_units=UnitConfig()
+)
+
+# 兼容旧代码的只读字典视图
+APP_CONFIG = MappingProxyType({
+    **asdict(APP),
+    'default_units': MappingProxyType({
+        sys.intern(k): v for k, v in asdict(APP.default_units).items()
+    })
+})
+
+# 目录是否已创建（首次访问数据库/项目时才创建）
+_dirs_ready = False
+
+# 已确认存在的目录，避免重复的mkdir系统调用
+_ensured_dirs = set()
+
+def ensure_dir(path) -> Path:
+    """确保目录存在，已确认存在的目录直接跳过"""
+    directory = Path(path)
+    if directory in _ensured_dirs:
+        return directory
+        
+    directory.mkdir(parents=True, exist_ok=True)
+    _ensured_dirs.add(directory)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("确保目录存在: %s", directory)
+    return directory
+
+def forget_dirs(path):
+    """从已确认目录缓存中移除指定目录及其子目录（目录被删除后调用）"""
+    root = Path(path)
+    for directory in [d for d in _ensured_dirs if d == root or root in d.parents]:
+        _ensured_dirs.discard(directory)
 
 # 创建必要的目录
 def create_directories():
-    """创建必要的项目目录"""
+    """创建必要的项目目录（仅首次调用时执行）"""
+    global _dirs_ready
+    if _dirs_ready:
+        return
+        
     directories = [
         DB_CONFIG['default_path'],
         DB_CONFIG['template_path'],
         DB_CONFIG['backup_path'],
-        BASE_DIR / 'data' / 'reports',
-        BASE_DIR / 'logs'
+        os.path.join(BASE_DIR_STR, 'data', 'reports'),
+        os.path.join(BASE_DIR_STR, 'logs')
     ]
     
+    # 收集所有目标目录及其位于BASE_DIR之下的上级目录，按深度排序后逐级创建，
+    # 共享的上级目录（如data/）只创建一次，每个目录只需一次mkdir调用
+    needed = set()
     for directory in directories:
-        directory.mkdir(parents=True, exist_ok=True)
-        print(f"确保目录存在: {directory}")
-
-# 初始化时创建目录
-create_directories()
\ No newline at end of file
+        path = Path(directory)
+        while path != BASE_DIR and path != path.parent and path not in needed:
+            needed.add(path)
+            path = path.parent
+            
+    for directory in sorted(needed, key=lambda p: len(p.parts)):
+        if directory in _ensured_dirs:
+            continue
+        try:
+            os.mkdir(directory)
+        except FileExistsError:
+            pass
+        _ensured_dirs.add(directory)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("确保目录存在: %s", directory)
+            
+    _dirs_ready = True
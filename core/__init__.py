@@ -2,15 +2,32 @@
 # -*- coding: utf-8 -*-
 """
 核心模块包
+
+子模块按需加载：首次访问 core.DatabaseManager 等名称时才导入对应模块。
+数据模型请显式导入，例如 from core.models import MaterialParameter
 """
 
-from .database import DatabaseManager
-from .project_manager import ProjectManager
-from .models import *
-from .data_sync import DataSyncEngine
+import importlib
+
+_LAZY = {
+    'DatabaseManager': '.database',
+    'ProjectManager': '.project_manager',
+    'DataSyncEngine': '.data_sync'
+}
 
 __all__ = [
     'DatabaseManager',
     'ProjectManager',
     'DataSyncEngine'
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(_LAZY[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
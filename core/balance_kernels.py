@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平衡计算数值内核
+
+纯数值计算部分（不涉及数据库和JSON），输入均为连续的float64/bool数组。
+安装了numba时使用 @njit(nogil=True) 编译（可在多个线程中并行执行），
+否则退回等价的NumPy向量化实现。
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 显热计算的参考温度 (°C)
+REFERENCE_TEMPERATURE = 25.0
+
+if NUMBA_AVAILABLE:
+
+    @njit("float64[:](float64[:], float64[:], float64[:, :], float64[:])", nogil=True, cache=True, fastmath=True)
+    def stream_heats(flow_rates, temperatures, comp_matrix, cp_vec):
+        """各流股显热 (kW)：Q = m/3600 * (T - 25) * Σ(x·Cp)"""
+        n_streams, n_materials = comp_matrix.shape
+        heats = np.empty(n_streams)
+        for i in range(n_streams):
+            cp_mix = 0.0
+            for j in range(n_materials):
+                cp_mix += comp_matrix[i, j] * cp_vec[j]
+            heats[i] = flow_rates[i] / 3600.0 * (temperatures[i] - REFERENCE_TEMPERATURE) * cp_mix
+        return heats
+
+    @njit("UniTuple(float64, 2)(float64[:], boolean[:])", nogil=True, cache=True, fastmath=True)
+    def split_totals(values, is_input):
+        """按输入/输出掩码分别求和，返回 (输入合计, 输出合计)"""
+        input_sum = 0.0
+        output_sum = 0.0
+        for i in range(values.shape[0]):
+            if is_input[i]:
+                input_sum += values[i]
+            else:
+                output_sum += values[i]
+        return input_sum, output_sum
+
+    @njit("UniTuple(float64, 2)(float64[:], float64[:], boolean[:])", nogil=True, cache=True, fastmath=True)
+    def water_totals(flow_rates, water_fractions, is_input):
+        """水量合计 (kg/h)，返回 (输入水量, 输出水量)"""
+        water_in = 0.0
+        water_out = 0.0
+        for i in range(flow_rates.shape[0]):
+            water_flow = flow_rates[i] * water_fractions[i]
+            if is_input[i]:
+                water_in += water_flow
+            else:
+                water_out += water_flow
+        return water_in, water_out
+
+else:
+
+    def stream_heats(flow_rates, temperatures, comp_matrix, cp_vec):
+        """各流股显热 (kW)：Q = m/3600 * (T - 25) * Σ(x·Cp)"""
+        return flow_rates / 3600.0 * (temperatures - REFERENCE_TEMPERATURE) * (comp_matrix @ cp_vec)
+
+    def split_totals(values, is_input):
+        """按输入/输出掩码分别求和，返回 (输入合计, 输出合计)"""
+        return float(values[is_input].sum()), float(values[~is_input].sum())
+
+    def water_totals(flow_rates, water_fractions, is_input):
+        """水量合计 (kg/h)，返回 (输入水量, 输出水量)"""
+        return split_totals(flow_rates * water_fractions, is_input)
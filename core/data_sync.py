@@ -4,15 +4,243 @@
 数据同步引擎 - 完整实现
 """
 
-from typing import Dict, List, Any, Optional, Set, Tuple
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from types import MappingProxyType
 import hashlib
-import json
+import logging
 import math
-from PySide6.QtCore import QObject, Signal
+import os
+import sqlite3
+import numpy as np
+from PySide6.QtCore import QObject, Signal, QTimer
 
 from .models import *
 from .database import DatabaseManager
+from . import fast_json
+from .balance_kernels import NUMBA_AVAILABLE, stream_heats, split_totals, water_totals
+
+logger = logging.getLogger(__name__)
+
+# 同步请求合并窗口（毫秒）
+FLUSH_DELAY_MS = 50
+
+# 热损失占输入热量的比例
+HEAT_LOSS_FRACTION = 0.05
+
+# 待计算热量平衡的单元数不少于该值时，流股显热在线程池中并行计算（numba内核释放GIL）
+PARALLEL_MIN_UNITS = 16
+# SQLite 3.31 起 json_insert 支持 '$[#]' 追加路径，可直接在数据库中增删平衡记录的流股ID
+SQLITE_JSON_APPEND = sqlite3.sqlite_version_info >= (3, 31, 0)
+# 待写入的数据版本记录达到此数量时立即批量写入，否则随下一次 flush 写入
+VERSION_BATCH_SIZE = 256
+
+# 工艺单元类型 -> 设备类型名称
+EQUIPMENT_TYPE_MAP = MappingProxyType({
+    'reactor': '反应器',
+    'separator': '分离器',
+    'heatex': '换热器',
+    'pump': '泵',
+    'compressor': '压缩机',
+    'tank': '储罐'
+})
+
+# 各模块中会影响下游同步的字段（同时兼容模型 to_dict 的 *_json 字段和原始字段），
+# 更新操作只有这些字段变化时才需要同步；须包含各 _sync_* 处理函数及其调用的计算读取的全部字段
+_RELEVANT_FIELDS = {
+    'material_params': (
+        'specific_heat', 'molar_mass', 'density', 'viscosity', 'thermal_conductivity',
+        'properties', 'properties_json'
+    ),
+    'process_materials': (
+        'name', 'phase', 'temperature', 'pressure', 'flow_rate', 'source_unit', 'destination_unit',
+        'composition', 'composition_json'
+    ),
+    'process_flow': (
+        'name', 'type', 'description', 'parameters', 'parameters_json', 'connections', 'connections_json'
+    ),
+    'equipment_list': (
+        'type', 'specifications', 'specifications_json', 'operating_conditions', 'operating_conditions_json',
+        'utility_requirements', 'utility_requirements_json'
+    )
+}
+
+# 热路径SQL（同一字符串对象反复执行，命中sqlite3连接的预编译语句缓存）
+_SQL_SELECT_STREAMS_FOR_UNIT = """
+    SELECT stream_id, name, temperature, flow_rate, composition_json, 
+           source_unit, destination_unit, is_water
+    FROM process_materials 
+    WHERE source_unit = ? OR destination_unit = ?
+    ORDER BY id"""
+
+# 一次扫描取出多个单元的流股，单元ID列表以JSON数组传入
+_SQL_SELECT_STREAMS_FOR_UNITS = """
+    SELECT stream_id, name, temperature, flow_rate, composition_json, 
+           source_unit, destination_unit, is_water
+    FROM process_materials 
+    WHERE source_unit IN (SELECT value FROM json_each(?))
+    OR destination_unit IN (SELECT value FROM json_each(?))
+    ORDER BY id"""
+
+_SQL_SELECT_UNIT_IDS = "SELECT unit_id FROM process_flow WHERE unit_id IS NOT NULL"
+
+_SQL_SELECT_UNIT_EDGES = """
+    SELECT DISTINCT source_unit, destination_unit FROM process_materials
+    WHERE source_unit IN (SELECT value FROM json_each(?))
+    AND destination_unit IN (SELECT value FROM json_each(?))
+    AND source_unit != destination_unit"""
+
+_SQL_SELECT_UNIT = "SELECT * FROM process_flow WHERE unit_id = ?"
+
+_SQL_SELECT_BALANCE_STREAMS = "SELECT input_streams_json, output_streams_json FROM material_balance WHERE unit_id = ?"
+
+_SQL_INSERT_MATERIAL_BALANCE = """
+    INSERT INTO material_balance 
+    (unit_id, balance_status, created_date, modified_date) 
+    VALUES (?, ?, ?, ?)"""
+
+_SQL_INSERT_MATERIAL_BALANCE_IF_MISSING = """
+    INSERT OR IGNORE INTO material_balance 
+    (unit_id, balance_status, created_date, modified_date) 
+    VALUES (?, ?, ?, ?)"""
+
+_SQL_UPSERT_MATERIAL_BALANCE = """
+    INSERT INTO material_balance 
+    (unit_id, balance_status, calculated_data_json, created_date, modified_date) 
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(unit_id) DO UPDATE SET
+        balance_status = excluded.balance_status,
+        calculated_data_json = excluded.calculated_data_json,
+        created_date = COALESCE(material_balance.created_date, excluded.created_date),
+        modified_date = excluded.modified_date"""
+
+_SQL_UPSERT_HEAT_BALANCE = """
+    INSERT INTO heat_balance 
+    (unit_id, input_heat_json, output_heat_json, heat_loss, 
+     efficiency, utility_requirements_json, calculated_data_json, 
+     balance_status, created_date, modified_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(unit_id) DO UPDATE SET
+        input_heat_json = excluded.input_heat_json,
+        output_heat_json = excluded.output_heat_json,
+        heat_loss = excluded.heat_loss,
+        efficiency = excluded.efficiency,
+        utility_requirements_json = excluded.utility_requirements_json,
+        calculated_data_json = excluded.calculated_data_json,
+        balance_status = excluded.balance_status,
+        modified_date = excluded.modified_date"""
+
+_SQL_UPSERT_WATER_BALANCE = """
+    INSERT INTO water_balance 
+    (unit_id, fresh_water_in, recycled_water_in, water_consumption, 
+     wastewater_out, reuse_possibilities, created_date, modified_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(unit_id) DO UPDATE SET
+        fresh_water_in = excluded.fresh_water_in,
+        recycled_water_in = excluded.recycled_water_in,
+        water_consumption = excluded.water_consumption,
+        wastewater_out = excluded.wastewater_out,
+        reuse_possibilities = excluded.reuse_possibilities,
+        modified_date = excluded.modified_date"""
+
+_SQL_UPDATE_STREAM_COMPOSITION = "UPDATE process_materials SET composition_json = ? WHERE stream_id = ?"
+
+_SQL_SELECT_STREAM_MATERIALS = "SELECT material_id FROM stream_composition WHERE stream_id = ?"
+
+_SQL_SELECT_STREAM_ENDPOINTS = """
+    SELECT stream_id, source_unit, destination_unit FROM process_materials WHERE stream_id = ?"""
+
+# is_water 由触发器维护，判断规则与 _is_water_stream 一致
+_SQL_SELECT_STREAM_WATER = """
+    SELECT is_water, source_unit, destination_unit FROM process_materials WHERE stream_id = ?"""
+
+# 流股ID列表以JSON数组传入，语句文本固定，可复用语句缓存
+_SQL_SELECT_STREAM_COMPOSITIONS = """
+    SELECT stream_id, composition_json FROM process_materials
+    WHERE stream_id IN (SELECT value FROM json_each(?))"""
+
+_SQL_MARK_MATERIAL_BALANCE_STALE = """
+    UPDATE material_balance SET balance_status = 'needs_recalculation' WHERE unit_id = ?"""
+
+# 向物料平衡的流股列表追加/删除流股ID（已存在/不存在时不修改），按列名生成
+_SQL_APPEND_BALANCE_STREAM = {
+    column: f"""
+    UPDATE material_balance 
+    SET {column} = json_insert(coalesce({column}, '[]'), '$[#]', ?), modified_date = ?
+    WHERE unit_id = ?
+    AND NOT EXISTS (SELECT 1 FROM json_each(coalesce({column}, '[]')) WHERE value = ?)"""
+    for column in ('input_streams_json', 'output_streams_json')
+}
+
+_SQL_REMOVE_BALANCE_STREAM = {
+    column: f"""
+    UPDATE material_balance 
+    SET {column} = json_remove({column}, (
+            SELECT '$[' || key || ']' FROM json_each({column}) WHERE value = ? LIMIT 1
+        )),
+        modified_date = ?
+    WHERE unit_id = ?
+    AND EXISTS (SELECT 1 FROM json_each({column}) WHERE value = ?)"""
+    for column in ('input_streams_json', 'output_streams_json')
+}
+
+_SQL_UPDATE_BALANCE_STREAMS = """
+    UPDATE material_balance 
+    SET input_streams_json = ?, output_streams_json = ?, modified_date = ?
+    WHERE unit_id = ?"""
+
+_SQL_SELECT_EQUIPMENT = "SELECT * FROM equipment_list WHERE equipment_id = ?"
+
+_SQL_SELECT_EQUIPMENT_SPECS = "SELECT specifications_json FROM equipment_list WHERE equipment_id = ?"
+
+# 按 EquipmentItem.to_dict() 的键绑定参数；设备已存在时不覆盖
+_SQL_INSERT_EQUIPMENT_IF_MISSING = """
+    INSERT OR IGNORE INTO equipment_list 
+    (equipment_id, name, type, model, specifications_json, quantity, material_of_construction,
+     operating_conditions_json, utility_requirements_json, manufacturer, created_date, modified_date)
+    VALUES (:equipment_id, :name, :type, :model, :specifications_json, :quantity, :material_of_construction,
+            :operating_conditions_json, :utility_requirements_json, :manufacturer, :created_date, :modified_date)"""
+
+# 设备名称由单元名称和设备类型组成，规格中只替换描述，读取和修改在一条语句中完成；
+# 名称和描述都未变化时不匹配任何行，不产生写入
+_SQL_UPDATE_EQUIPMENT_FROM_UNIT = """
+    UPDATE equipment_list 
+    SET name = :unit_name || ' - ' || type,
+        specifications_json = json_set(coalesce(specifications_json, '{}'), '$.description', :description),
+        modified_date = :modified_date
+    WHERE equipment_id = :equipment_id
+    AND (name IS NOT :unit_name || ' - ' || type
+         OR json_extract(specifications_json, '$.description') IS NOT :description)"""
+
+_SQL_DELETE_EQUIPMENT = "DELETE FROM equipment_list WHERE equipment_id = ?"
+
+_SQL_SELECT_MAX_VERSION = """
+    SELECT MAX(version) AS max_version 
+    FROM data_versions 
+    WHERE module_name = ? AND data_id = ?"""
+
+_SQL_INSERT_DATA_VERSION = """
+    INSERT INTO data_versions 
+    (module_name, data_id, version, data_hash, change_description, changed_by, changed_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+
+@dataclass
+class StreamSoA:
+    """单元流股的列式（SoA）数值视图，每个数组的第i项对应第i个流股"""
+    stream_ids: List[str]
+    components: List[str]        # 组成矩阵各列对应的物料ID
+    flow_rates: np.ndarray       # kg/h，空值为0
+    temperatures: np.ndarray     # °C，空值为0
+    is_input: np.ndarray         # 目标单元为本单元
+    is_output: np.ndarray        # 源单元为本单元（且不是输入）
+    has_composition: np.ndarray  # 组成非空
+    is_water: np.ndarray         # 水流股标记
+    water_fractions: np.ndarray  # 水含量（组成中的water，纯水流股为1）
+    comp_matrix: np.ndarray      # 流股 × 组分的质量分数
 
 class DataSyncEngine(QObject):
     """数据同步引擎 - 完整实现"""
@@ -20,87 +248,545 @@ class DataSyncEngine(QObject):
     # 信号定义
     data_updated = Signal(str, str)  # (模块名, 数据ID)
     sync_completed = Signal(str, bool, str)  # (同步类型, 成功状态, 消息)
-    calculation_completed = Signal(str, Dict[str, Any])  # (计算类型, 结果)
+    calculations_completed = Signal(list)  # [(计算类型, 结果), ...]，每次 flush 提交后发出一次
+    
+    # 同步规则：源模块 -> 触发操作、目标模块及各目标的同步方法名
+    _SYNC_RULES = MappingProxyType({
+        'material_params': {
+            'triggers': frozenset({'add', 'update', 'delete'}),
+            'targets': ('process_materials', 'material_balance', 'heat_balance'),
+            'rules': {
+                'process_materials': '_sync_material_to_process',
+                'material_balance': '_sync_material_to_balance',
+                'heat_balance': '_sync_material_to_heat'
+            }
+        },
+        'process_materials': {
+            'triggers': frozenset({'add', 'update', 'delete'}),
+            'targets': ('material_balance', 'heat_balance', 'water_balance', 'process_flow'),
+            'rules': {
+                'material_balance': '_sync_process_to_balance',
+                'heat_balance': '_sync_process_to_heat',
+                'water_balance': '_sync_process_to_water',
+                'process_flow': '_sync_process_to_flow'
+            }
+        },
+        'process_flow': {
+            'triggers': frozenset({'add', 'update', 'delete'}),
+            'targets': ('equipment_list', 'material_balance', 'heat_balance'),
+            'rules': {
+                'equipment_list': '_sync_unit_to_equipment',
+                'material_balance': '_sync_unit_to_balance',
+                'heat_balance': '_sync_unit_to_heat'
+            }
+        },
+        'equipment_list': {
+            'triggers': frozenset({'add', 'update', 'delete'}),
+            'targets': ('material_balance', 'heat_balance', 'water_balance'),
+            'rules': {
+                'material_balance': '_sync_equipment_to_balance',
+                'heat_balance': '_sync_equipment_to_heat',
+                'water_balance': '_sync_equipment_to_water'
+            }
+        }
+    })
     
     def __init__(self, db_manager: DatabaseManager):
         super().__init__()
         self.db = db_manager
         self.sync_rules = self._initialize_sync_rules()
-        self.calculation_cache = {}  # 计算缓存
+        # 源模块 -> 按目标顺序排列的 (目标模块, 同步方法)，分发时直接遍历
+        self._sync_processors: Dict[str, Tuple[Tuple[str, Callable], ...]] = {
+            source_module: tuple(
+                (target, rule['rules'][target]) for target in rule['targets'] if target in rule['rules']
+            )
+            for source_module, rule in self.sync_rules.items()
+        }
+        # 源模块 -> 同步完成信号中的描述
+        self._sync_labels: Dict[str, str] = {
+            source_module: f"{source_module}->{','.join(rule['targets'])}"
+            for source_module, rule in self.sync_rules.items()
+        }
+        self.calculation_cache = {}  # 计算缓存：(平衡类型, 单元ID) -> (输入内容哈希, 计算结果)
+        # 各数据的最新版本号：(模块名, 数据ID) -> 版本，命中时无需查询 data_versions
+        self._versions: Dict[Tuple[str, str], int] = {}
+        # 待批量写入 data_versions 的记录
+        self._pending_versions: List[Tuple] = []
+        # 最近一次同步的相关字段签名：(源模块, 数据ID) -> 摘要，用于跳过无实质变化的更新
+        self._last_sig: Dict[Tuple[str, str], bytes] = {}
+        
+        # 同步请求队列：(源模块, 操作, 数据ID, 数据)，由 flush() 统一处理
+        self._pending = deque()
+        # 待重新计算的单元，按平衡类型分组，每次 flush 中每个单元只计算一次
+        self._dirty_units: Dict[str, Set[str]] = {
+            'material_balance': set(),
+            'heat_balance': set(),
+            'water_balance': set()
+        }
+        self._flush_scheduled = False
+        # 本次 flush 中完成的计算 (计算类型, 结果)，提交后通过 calculations_completed 一次发出
+        self._completed_calculations: List[Tuple[str, Dict[str, Any]]] = []
+        # flush 事务进行中时为 True，期间的写操作不单独提交，由 flush 统一提交或回滚
+        self._in_batch = False
+        # 本次 flush 的统一时间戳，flush 期间写入的所有记录共用
+        self._flush_time: Optional[str] = None
+        # 本次 flush 中已查询的单元流股 (单元ID -> 流股行)，三种平衡计算共用
+        self._stream_cache_per_flush: Dict[str, List[Dict[str, Any]]] = {}
+        # 本次 flush 中已构建的单元流股列式视图 (单元ID -> StreamSoA)
+        self._soa_cache_per_flush: Dict[str, StreamSoA] = {}
+        # 本次 flush 中已读取的流股两端单元 (流股ID -> (源单元, 目标单元))
+        self._stream_endpoints: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        
+        # 依赖图（首次使用时从数据库加载）：物料 -> 流股 -> 单元
+        self._dep_loaded = False
+        self._material_streams: Dict[str, Set[str]] = {}  # 物料ID -> 含该物料的流股ID
+        self._stream_materials: Dict[str, Set[str]] = {}  # 流股ID -> 流股组成中的物料ID
+        self._stream_units: Dict[str, Set[str]] = {}      # 流股ID -> 流股两端的单元ID
+        # 各流股显热贡献缓存 (kW)，流股或其组分物料变化时失效
+        self._stream_heat: Dict[str, float] = {}
+        # 物料参数缓存及其稠密索引 (物料ID -> 列号, 比热向量)，物料变化时失效
+        self._material_cache: Optional[Dict[str, MaterialParameter]] = None
+        self._material_index: Optional[Tuple[Dict[str, int], np.ndarray]] = None
+        # 数值内核线程池（首次并行计算时创建，各次 flush 复用）
+        self._executor: Optional[ThreadPoolExecutor] = None
         
-    def _initialize_sync_rules(self) -> Dict[str, Dict[str, List[str]]]:
-        """初始化同步规则"""
+    def _initialize_sync_rules(self) -> Dict[str, Dict[str, Any]]:
+        """初始化同步规则（将 _SYNC_RULES 中的方法名绑定到本实例）"""
         return {
-            'material_params': {
-                'triggers': ['add', 'update', 'delete'],
-                'targets': ['process_materials', 'material_balance', 'heat_balance'],
-                'rules': {
-                    'process_materials': self._sync_material_to_process,
-                    'material_balance': self._sync_material_to_balance,
-                    'heat_balance': self._sync_material_to_heat
-                }
-            },
-            'process_materials': {
-                'triggers': ['add', 'update', 'delete'],
-                'targets': ['material_balance', 'heat_balance', 'water_balance', 'process_flow'],
-                'rules': {
-                    'material_balance': self._sync_process_to_balance,
-                    'heat_balance': self._sync_process_to_heat,
-                    'water_balance': self._sync_process_to_water,
-                    'process_flow': self._sync_process_to_flow
-                }
-            },
-            'process_flow': {
-                'triggers': ['add', 'update', 'delete'],
-                'targets': ['equipment_list', 'material_balance', 'heat_balance'],
-                'rules': {
-                    'equipment_list': self._sync_unit_to_equipment,
-                    'material_balance': self._sync_unit_to_balance,
-                    'heat_balance': self._sync_unit_to_heat
-                }
-            },
-            'equipment_list': {
-                'triggers': ['add', 'update', 'delete'],
-                'targets': ['material_balance', 'heat_balance', 'water_balance'],
-                'rules': {
-                    'material_balance': self._sync_equipment_to_balance,
-                    'heat_balance': self._sync_equipment_to_heat,
-                    'water_balance': self._sync_equipment_to_water
-                }
+            source_module: {
+                'triggers': rule['triggers'],
+                'targets': rule['targets'],
+                'rules': {target: getattr(self, method_name) for target, method_name in rule['rules'].items()}
             }
+            for source_module, rule in self._SYNC_RULES.items()
         }
         
     def sync_data(self, source_module: str, operation: str, data_id: str, data: Optional[Dict[str, Any]] = None):
         """
         同步数据
         
+        请求先进入队列，在合并窗口结束后由 flush() 统一处理，
+        同一窗口内受影响的单元只重新计算一次。
+        
         Args:
             source_module: 源模块名
             operation: 操作类型 (add, update, delete)
             data_id: 数据ID
             data: 数据内容 (删除操作时为None)
         """
-        if source_module not in self.sync_rules:
+        rule = self._SYNC_RULES.get(source_module)
+        if rule is None or operation not in rule['triggers']:
             return
             
-        rules = self.sync_rules[source_module]
+        # 更新只涉及无关字段（如描述）时不触发下游同步；没有数据内容时无法判断，照常同步
+        sig_key = (source_module, data_id)
+        if operation == 'delete' or not data:
+            self._last_sig.pop(sig_key, None)
+        else:
+            signature = self._sync_signature(source_module, data)
+            if operation == 'update' and self._last_sig.get(sig_key) == signature:
+                self.sync_completed.emit(source_module, True, "no-op")
+                return
+            self._last_sig[sig_key] = signature
+            
+        self._pending.append((source_module, operation, data_id, data))
+        self._schedule_flush()
         
-        if operation not in rules['triggers']:
+    def _schedule_flush(self):
+        """在合并窗口结束后执行 flush（窗口内只安排一次）"""
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            QTimer.singleShot(FLUSH_DELAY_MS, self.flush)
+            
+    def _sync_signature(self, source_module: str, data: Dict[str, Any]) -> bytes:
+        """计算数据中影响下游同步的字段的摘要"""
+        relevant = {field_name: data.get(field_name) for field_name in _RELEVANT_FIELDS.get(source_module, ())}
+        payload = fast_json.dumps_bytes(relevant, sort_keys=True, default=str)
+        return hashlib.blake2b(payload, digest_size=16).digest()
+        
+    def flush(self):
+        """处理队列中的同步请求，并在单个事务中重新计算受影响单元的平衡"""
+        self._flush_scheduled = False
+        
+        if not self._pending and not any(self._dirty_units.values()) and not self._pending_versions:
             return
             
+        # 合并连续的相同请求（同一数据的连续修改只处理最后一次）
+        requests = []
+        while self._pending:
+            request = self._pending.popleft()
+            if requests and requests[-1][:3] == request[:3]:
+                requests[-1] = request
+            else:
+                requests.append(request)
+                
+        connection = self.db.connection
+        self._flush_time = datetime.now().isoformat()
+        self._in_batch = True
+        try:
+            if not connection.in_transaction:
+                connection.execute("BEGIN IMMEDIATE")
+                
+            for source_module, operation, data_id, data in requests:
+                self._apply_sync_rules(source_module, operation, data_id, data)
+                
+            self._recalculate_dirty_units()
+            self._write_pending_versions()
+            connection.commit()
+            
+            if self._completed_calculations:
+                completed, self._completed_calculations = self._completed_calculations, []
+                self.calculations_completed.emit(completed)
+            
+        except Exception as e:
+            logger.exception("数据同步提交失败: %s", e)
+            connection.rollback()
+            # 回滚后已缓存的计算结果、流股热量、签名和版本号不再代表数据库中的数据，
+            # 否则下次相同输入会命中缓存而跳过写入
+            self.invalidate_caches()
+            self._pending_versions.clear()
+            self._completed_calculations.clear()
+            
+        finally:
+            self._in_batch = False
+            self._flush_time = None
+            self._stream_cache_per_flush.clear()
+            self._soa_cache_per_flush.clear()
+            self._stream_endpoints.clear()
+            
+    def _commit(self):
+        """提交写操作（flush 事务中由 flush 统一提交）"""
+        if not self._in_batch:
+            self.db.connection.commit()
+            
+    def _timestamp(self) -> str:
+        """获取写入记录用的时间戳（flush 期间为统一的时间戳）"""
+        return self._flush_time or datetime.now().isoformat()
+            
+    def _apply_sync_rules(self, source_module: str, operation: str, data_id: str, data: Optional[Dict[str, Any]]):
+        """按同步规则将变更分发到各目标模块"""
+        # 先更新依赖图和流股热量缓存，使后续规则基于最新的依赖关系
+        if source_module == 'process_materials':
+            self._refresh_stream_dependencies(data_id)
+        elif source_module == 'material_params':
+            self._invalidate_materials()
+            self._ensure_dependencies()
+            for stream_id in self._material_streams.get(data_id, ()):
+                self._stream_heat.pop(stream_id, None)
+        elif source_module == 'process_flow':
+            self._forget_calculations(data_id)
+                
+        target_module = None
         try:
-            for target_module in rules['targets']:
-                if target_module in rules['rules']:
-                    sync_func = rules['rules'][target_module]
-                    sync_func(source_module, operation, data_id, data)
+            for target_module, sync_func in self._sync_processors[source_module]:
+                sync_func(source_module, operation, data_id, data)
                     
-            self.sync_completed.emit(f"{source_module}->{','.join(rules['targets'])}", True, "同步成功")
+            # 物料已删除，所有规则处理完毕后再移除其依赖节点
+            if source_module == 'material_params' and operation == 'delete':
+                self._material_streams.pop(data_id, None)
+                
+            self.sync_completed.emit(self._sync_labels[source_module], True, "同步成功")
             
         except Exception as e:
             error_msg = f"数据同步失败 {source_module} -> {target_module}: {str(e)}"
-            print(error_msg)
+            logger.exception(error_msg)
             self.sync_completed.emit(source_module, False, error_msg)
             
+    # ========== 依赖图 ==========
+    
+    def _ensure_dependencies(self):
+        """首次使用时从数据库加载物料-流股-单元依赖图"""
+        if self._dep_loaded:
+            return
+            
+        self._material_streams = {}
+        self._stream_materials = {}
+        self._stream_units = {}
+        
+        # 全表加载的循环中使用局部变量，避免每行重复查找属性
+        add_composition_edge = self._add_composition_edge
+        set_stream_units = self._set_stream_units
+        
+        # 物料-流股关系直接读取索引表，无需解析组成JSON
+        for row in self.db.execute_query("SELECT stream_id, material_id FROM stream_composition"):
+            add_composition_edge(row['stream_id'], row['material_id'])
+            
+        for row in self.db.execute_query("SELECT stream_id, source_unit, destination_unit FROM process_materials"):
+            set_stream_units(row)
+            
+        self._dep_loaded = True
+        
+    def _add_composition_edge(self, stream_id: str, material_id: str):
+        """添加一条物料-流股依赖边"""
+        self._stream_materials.setdefault(stream_id, set()).add(material_id)
+        self._material_streams.setdefault(material_id, set()).add(stream_id)
+        
+    def _set_stream_units(self, row: Dict[str, Any]):
+        """记录流股两端的单元"""
+        self._stream_units[row['stream_id']] = {
+            unit_id for unit_id in (row['source_unit'], row['destination_unit']) if unit_id
+        }
+        
+    def _refresh_stream_dependencies(self, stream_id: str):
+        """流股变化后重新读取其依赖关系，并使其热量缓存失效"""
+        self._ensure_dependencies()
+        
+        for material_id in self._stream_materials.pop(stream_id, ()):
+            streams = self._material_streams.get(material_id)
+            if streams:
+                streams.discard(stream_id)
+        self._stream_units.pop(stream_id, None)
+        self._stream_heat.pop(stream_id, None)
+        
+        for row in self.db.execute_query(_SQL_SELECT_STREAM_MATERIALS, (stream_id,)):
+            self._add_composition_edge(stream_id, row['material_id'])
+            
+        for row in self.db.execute_query(_SQL_SELECT_STREAM_ENDPOINTS, (stream_id,)):
+            self._set_stream_units(row)
+            self._stream_endpoints[stream_id] = (row['source_unit'], row['destination_unit'])
+            
+    def _units_for_material(self, material_id: str) -> Set[str]:
+        """通过依赖图查找使用该物料的单元"""
+        self._ensure_dependencies()
+        
+        units = set()
+        for stream_id in self._material_streams.get(material_id, ()):
+            units.update(self._stream_units.get(stream_id, ()))
+        return units
+        
+    def _invalidate_dependencies(self):
+        """清空依赖图和流股缓存，下次使用时重新加载"""
+        self._dep_loaded = False
+        self._material_streams = {}
+        self._stream_materials = {}
+        self._stream_units = {}
+        self._stream_heat = {}
+        self._invalidate_materials()
+        
+    def invalidate_caches(self):
+        """
+        清空引擎缓存的全部数据库状态（依赖图、物料、流股热量、计算结果、签名和版本号）
+        
+        数据库内容在同步引擎之外被整体替换（导入项目、恢复备份）后调用，之后的计算重新读取数据库
+        """
+        self._invalidate_dependencies()
+        self.calculation_cache.clear()
+        self._last_sig.clear()
+        self._versions.clear()
+        
+    # ========== 物料缓存 ==========
+    
+    def _materials(self) -> Dict[str, MaterialParameter]:
+        """获取物料参数字典（缓存，物料变化时重新加载）"""
+        if self._material_cache is None:
+            self._material_cache = {mat.material_id: mat for mat in self.db.get_all_materials()}
+        return self._material_cache
+        
+    def _material_vectors(self) -> Tuple[Dict[str, int], np.ndarray]:
+        """获取物料稠密索引和对应的比热向量"""
+        if self._material_index is None:
+            material_dict = self._materials()
+            mat_idx = {material_id: i for i, material_id in enumerate(material_dict)}
+            cp_vec = np.fromiter(
+                (material.specific_heat or 0.0 for material in material_dict.values()),
+                dtype=np.float64, count=len(mat_idx)
+            )
+            self._material_index = (mat_idx, cp_vec)
+        return self._material_index
+        
+    def _invalidate_materials(self):
+        """使物料参数缓存失效"""
+        self._material_cache = None
+        self._material_index = None
+        
+    def _streams_for_unit(self, unit_id: str) -> List[Dict[str, Any]]:
+        """获取单元的输入输出流股（只查询平衡计算用到的列，同一次 flush 中只查询一次）"""
+        streams = self._stream_cache_per_flush.get(unit_id)
+        if streams is None:
+            streams = self.db.execute_query(_SQL_SELECT_STREAMS_FOR_UNIT, (unit_id, unit_id))
+            self._stream_cache_per_flush[unit_id] = streams
+        return streams
+        
+    def _prefetch_streams(self, unit_ids: Set[str]):
+        """用一次查询取出多个单元的流股并填入本次 flush 的流股缓存，避免逐单元查询"""
+        missing = [unit_id for unit_id in unit_ids if unit_id not in self._stream_cache_per_flush]
+        if len(missing) < 2:
+            return
+            
+        streams_by_unit: Dict[str, List[Dict[str, Any]]] = {unit_id: [] for unit_id in missing}
+        ids_json = fast_json.dumps(missing)
+        for row in self.db.execute_query(_SQL_SELECT_STREAMS_FOR_UNITS, (ids_json, ids_json)):
+            source_unit = row['source_unit']
+            destination_unit = row['destination_unit']
+            if source_unit in streams_by_unit:
+                streams_by_unit[source_unit].append(row)
+            if destination_unit != source_unit and destination_unit in streams_by_unit:
+                streams_by_unit[destination_unit].append(row)
+                
+        self._stream_cache_per_flush.update(streams_by_unit)
+        
+    def _build_soa(self, unit_id: str) -> StreamSoA:
+        """将单元流股打包为列式数组（同一次 flush 中只构建一次），组成JSON直接解析进稠密矩阵"""
+        soa = self._soa_cache_per_flush.get(unit_id)
+        if soa is not None:
+            return soa
+            
+        streams = self._streams_for_unit(unit_id)
+        n_streams = len(streams)
+        
+        loads = fast_json.loads
+        compositions = []
+        comp_idx: Dict[str, int] = {}
+        for row in streams:
+            composition = loads(row['composition_json']) if row['composition_json'] else {}
+            compositions.append(composition)
+            for material_id in composition:
+                if material_id not in comp_idx:
+                    comp_idx[material_id] = len(comp_idx)
+                    
+        comp_matrix = np.zeros((n_streams, len(comp_idx)))
+        water_fractions = np.zeros(n_streams)
+        for i, composition in enumerate(compositions):
+            for material_id, fraction in composition.items():
+                comp_matrix[i, comp_idx[material_id]] = fraction
+            if 'water' in composition:
+                water_fractions[i] = composition['water']
+            elif '水' in streams[i]['name']:
+                water_fractions[i] = 1.0  # 假设纯水流股
+                
+        is_input = np.array([row['destination_unit'] == unit_id for row in streams], dtype=np.bool_)
+        soa = StreamSoA(
+            stream_ids=[row['stream_id'] for row in streams],
+            components=list(comp_idx),
+            flow_rates=np.array([row['flow_rate'] or 0.0 for row in streams], dtype=np.float64),
+            temperatures=np.array([row['temperature'] or 0.0 for row in streams], dtype=np.float64),
+            is_input=is_input,
+            is_output=~is_input & np.array([row['source_unit'] == unit_id for row in streams], dtype=np.bool_),
+            has_composition=np.array([bool(composition) for composition in compositions], dtype=np.bool_),
+            is_water=np.array([bool(row['is_water']) for row in streams], dtype=np.bool_),
+            water_fractions=water_fractions,
+            comp_matrix=comp_matrix
+        )
+        self._soa_cache_per_flush[unit_id] = soa
+        return soa
+        
+    # ========== 计算结果缓存 ==========
+    
+    def _balance_key(self, kind: str, unit_id: str, streams: List[Dict[str, Any]], 
+                     extra: Any = None) -> str:
+        """
+        计算平衡输入内容的哈希键
+        
+        按流股ID排序后对参与计算的字段取blake2b摘要，extra 为单元参数、物料比热等附加输入
+        """
+        rows = sorted(
+            (
+                row['stream_id'], row['source_unit'], row['destination_unit'], row['name'],
+                row['flow_rate'], row['temperature'], row['composition_json']
+            )
+            for row in streams
+        )
+        payload = repr((kind, unit_id, rows, extra)).encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+        
+    def _cached_result(self, kind: str, unit_id: str, key: str) -> Optional[Dict[str, Any]]:
+        """输入内容未变化时返回上次的计算结果"""
+        cached = self.calculation_cache.get((kind, unit_id))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        return None
+        
+    def _forget_calculations(self, unit_id: str):
+        """移除单元的所有缓存计算结果"""
+        for kind in self._dirty_units:
+            self.calculation_cache.pop((kind, unit_id), None)
+            
+    def _mark_dirty(self, balance_type: str, unit_id: str):
+        """标记单元的某类平衡需要在本次 flush 中重新计算"""
+        self._dirty_units[balance_type].add(unit_id)
+        
+    def _recalculate_dirty_units(self):
+        """重新计算所有被标记的单元（每个单元每类平衡只计算一次）"""
+        calculators = {
+            'material_balance': self._calculate_material_balance_for_unit,
+            'heat_balance': self._calculate_heat_balance_for_unit,
+            'water_balance': self._calculate_water_balance_for_unit
+        }
+        
+        all_dirty = set().union(*self._dirty_units.values())
+        if not all_dirty:
+            return
+            
+        # 按流股方向从上游到下游计算，输入内容未变化的单元由计算缓存跳过
+        order = self._topological_order(all_dirty)
+        self._prefetch_streams(all_dirty)
+        
+        heat_dirty = self._dirty_units['heat_balance']
+        if NUMBA_AVAILABLE and len(heat_dirty) >= PARALLEL_MIN_UNITS:
+            self._precompute_stream_heats([unit_id for unit_id in order if unit_id in heat_dirty])
+            
+        for balance_type, calculate in calculators.items():
+            dirty = self._dirty_units[balance_type]
+            for unit_id in order:
+                if unit_id in dirty:
+                    dirty.discard(unit_id)
+                    calculate(unit_id)
+            while dirty:
+                calculate(dirty.pop())
+                
+    def _precompute_stream_heats(self, unit_ids: List[str]):
+        """
+        并行计算各单元未缓存流股的显热
+        
+        数据库读取和结果写入都在主线程完成，线程池中只执行释放GIL的数值内核
+        """
+        jobs = []
+        scheduled = set()
+        for unit_id in unit_ids:
+            soa = self._build_soa(unit_id)
+            rows = [
+                i for i in self._heat_rows(soa)
+                if soa.stream_ids[i] not in self._stream_heat and soa.stream_ids[i] not in scheduled
+            ]
+            if rows:
+                scheduled.update(soa.stream_ids[i] for i in rows)
+                jobs.append((soa, np.array(rows, dtype=np.intp)))
+                
+        if not jobs:
+            return
+            
+        # 物料索引在主线程中建立，工作线程只读
+        self._material_vectors()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='balance')
+        for heats in self._executor.map(lambda job: self._compute_stream_heats(*job), jobs):
+            self._stream_heat.update(heats)
+                
+    def _topological_order(self, unit_ids: Set[str]) -> List[str]:
+        """按流股连接关系（源单元 -> 目标单元）对单元拓扑排序，循环物流中的单元排在最后"""
+        ids_json = fast_json.dumps(sorted(unit_ids))
+        edges = self.db.execute_query(_SQL_SELECT_UNIT_EDGES, (ids_json, ids_json))
+        
+        downstream: Dict[str, List[str]] = {unit_id: [] for unit_id in unit_ids}
+        in_degree = dict.fromkeys(unit_ids, 0)
+        for edge in edges:
+            downstream[edge['source_unit']].append(edge['destination_unit'])
+            in_degree[edge['destination_unit']] += 1
+            
+        queue = deque(sorted(unit_id for unit_id, degree in in_degree.items() if degree == 0))
+        order = []
+        while queue:
+            unit_id = queue.popleft()
+            order.append(unit_id)
+            for target in downstream[unit_id]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+                    
+        if len(order) < len(unit_ids):
+            order.extend(sorted(unit_id for unit_id, degree in in_degree.items() if degree > 0))
+        return order
+            
     # ========== 物料参数同步 ==========
     
     def _sync_material_to_process(self, source_module: str, operation: str, material_id: str, data: Optional[Dict[str, Any]]):
@@ -145,33 +831,34 @@ class DataSyncEngine(QObject):
         related_units = self._find_units_for_stream(stream_id, stream)
         
         for unit_id in related_units:
-            # 获取或创建物料平衡记录
-            balance = self._get_or_create_material_balance(unit_id)
-            
-            # 更新输入输出流列表
-            self._update_balance_streams(balance, stream_id, operation, stream)
+            # 更新输入输出流列表（物料平衡记录不存在时先创建）
+            if SQLITE_JSON_APPEND:
+                self._update_balance_streams_in_db(unit_id, stream_id, operation, stream)
+            else:
+                input_streams, output_streams = self._get_or_create_balance_streams(unit_id)
+                self._update_balance_streams(unit_id, input_streams, output_streams, stream_id, operation, stream)
             
             # 重新计算物料平衡
-            self._calculate_material_balance_for_unit(unit_id)
+            self._mark_dirty('material_balance', unit_id)
             
     def _sync_process_to_heat(self, source_module: str, operation: str, stream_id: str, data: Optional[Dict[str, Any]]):
         """同步过程物料到热量平衡"""
         if operation in ['add', 'update']:
             # 重新计算相关单元的热量平衡
-            stream = self.db.get_process_material(stream_id)
-            if stream:
-                related_units = self._find_units_for_stream(stream_id, stream)
-                for unit_id in related_units:
-                    self._calculate_heat_balance_for_unit(unit_id)
+            for unit_id in self._find_units_for_stream(stream_id):
+                self._mark_dirty('heat_balance', unit_id)
                     
     def _sync_process_to_water(self, source_module: str, operation: str, stream_id: str, data: Optional[Dict[str, Any]]):
         """同步过程物料到水平衡"""
         if operation in ['add', 'update']:
-            stream = self.db.get_process_material(stream_id)
-            if stream and self._is_water_stream(stream):
-                related_units = self._find_units_for_stream(stream_id, stream)
-                for unit_id in related_units:
-                    self._calculate_water_balance_for_unit(unit_id)
+            # 只读取水流股标记和两端单元，不必构造完整的流股对象
+            rows = self.db.execute_query(_SQL_SELECT_STREAM_WATER, (stream_id,))
+            if rows and rows[0]['is_water']:
+                endpoints = (rows[0]['source_unit'], rows[0]['destination_unit'])
+                self._stream_endpoints[stream_id] = endpoints
+                for unit_id in endpoints:
+                    if unit_id:
+                        self._mark_dirty('water_balance', unit_id)
                     
     def _sync_process_to_flow(self, source_module: str, operation: str, stream_id: str, data: Optional[Dict[str, Any]]):
         """同步过程物料到工艺路线"""
@@ -202,25 +889,23 @@ class DataSyncEngine(QObject):
             self._create_material_balance_for_unit(unit_id, data)
         elif operation in ['add', 'update', 'delete']:
             # 重新计算物料平衡
-            self._calculate_material_balance_for_unit(unit_id)
+            self._mark_dirty('material_balance', unit_id)
             
     def _sync_unit_to_heat(self, source_module: str, operation: str, unit_id: str, data: Optional[Dict[str, Any]]):
         """同步工艺单元到热量平衡"""
         if operation in ['add', 'update', 'delete']:
             # 重新计算热量平衡
-            self._calculate_heat_balance_for_unit(unit_id)
+            self._mark_dirty('heat_balance', unit_id)
             
     # ========== 设备清单同步 ==========
     
     def _sync_equipment_to_balance(self, source_module: str, operation: str, equipment_id: str, data: Optional[Dict[str, Any]]):
         """同步设备清单到物料平衡"""
         if operation in ['add', 'update']:
-            # 设备变化可能影响物料平衡（如设备效率变化）
-            equipment = self.db.get_module_data('equipment_list')
-            # 查找相关单元
+            # 设备变化可能影响物料平衡（如设备效率变化），查找相关单元
             related_units = self._find_units_for_equipment(equipment_id)
             for unit_id in related_units:
-                self._calculate_material_balance_for_unit(unit_id)
+                self._mark_dirty('material_balance', unit_id)
                 
     def _sync_equipment_to_heat(self, source_module: str, operation: str, equipment_id: str, data: Optional[Dict[str, Any]]):
         """同步设备清单到热量平衡"""
@@ -228,102 +913,68 @@ class DataSyncEngine(QObject):
             # 设备变化可能影响热量平衡（如换热器效率变化）
             related_units = self._find_units_for_equipment(equipment_id)
             for unit_id in related_units:
-                self._calculate_heat_balance_for_unit(unit_id)
+                self._mark_dirty('heat_balance', unit_id)
                 
     def _sync_equipment_to_water(self, source_module: str, operation: str, equipment_id: str, data: Optional[Dict[str, Any]]):
         """同步设备清单到水平衡"""
         if operation in ['add', 'update']:
             # 设备变化可能影响水平衡（如泵的耗水量变化）
-            equipment = self.db.execute_query(
-                "SELECT * FROM equipment_list WHERE equipment_id = ?", 
-                (equipment_id,)
-            )
+            equipment = self.db.execute_query(_SQL_SELECT_EQUIPMENT, (equipment_id,))
             if equipment and equipment[0].get('type') in ['pump', 'cooling_tower', 'boiler']:
                 related_units = self._find_units_for_equipment(equipment_id)
                 for unit_id in related_units:
-                    self._calculate_water_balance_for_unit(unit_id)
+                    self._mark_dirty('water_balance', unit_id)
                     
     # ========== 核心计算方法 ==========
     
     def _calculate_material_balance_for_unit(self, unit_id: str):
         """计算单元的物料平衡"""
         try:
-            # 获取物料平衡记录
-            balance_data = self.db.execute_query(
-                "SELECT * FROM material_balance WHERE unit_id = ?", 
-                (unit_id,)
-            )
-            
-            if not balance_data:
-                # 如果没有物料平衡记录，创建新的
-                balance = MaterialBalance(unit_id=unit_id)
-                self.db.cursor.execute(
-                    """INSERT INTO material_balance 
-                    (unit_id, balance_status, created_date, modified_date) 
-                    VALUES (?, ?, ?, ?)""",
-                    (unit_id, 'calculated', datetime.now().isoformat(), datetime.now().isoformat())
-                )
-                self.db.connection.commit()
-                balance_data = [{'unit_id': unit_id}]
-                
             # 获取单元的输入输出流
-            streams = self.db.execute_query(
-                """SELECT * FROM process_materials 
-                WHERE source_unit = ? OR destination_unit = ?""",
-                (unit_id, unit_id)
-            )
+            streams = self._streams_for_unit(unit_id)
             
-            input_streams = []
-            output_streams = []
-            process_streams = []
-            
-            for stream_data in streams:
-                stream = ProcessMaterial.from_dict(stream_data)
-                process_streams.append(stream)
-                if stream.destination_unit == unit_id:
-                    input_streams.append(stream)
-                elif stream.source_unit == unit_id:
-                    output_streams.append(stream)
-                    
-            if not input_streams and not output_streams:
+            key = self._balance_key('material_balance', unit_id, streams)
+            if self._cached_result('material_balance', unit_id, key) is not None:
+                return
+                
+            soa = self._build_soa(unit_id)
+            if not soa.is_input.any() and not soa.is_output.any():
                 return
                 
             # 创建物料平衡对象并计算
             balance = MaterialBalance(unit_id=unit_id)
-            results = balance.calculate_balance(input_streams, output_streams)
+            results = balance.calculate_from_arrays(
+                soa.flow_rates, soa.is_input, soa.is_output, soa.components, soa.comp_matrix
+            )
             
             # 保存计算结果
-            calculated_data_json = json.dumps(results, ensure_ascii=False)
+            calculated_data_json = fast_json.dumps(results)
             
-            # 更新数据库
+            # 插入或更新记录（已存在时保留创建时间）
+            now = self._timestamp()
             self.db.cursor.execute(
-                """UPDATE material_balance 
-                SET balance_status = ?, calculated_data_json = ?, modified_date = ?
-                WHERE unit_id = ?""",
-                (balance.balance_status, calculated_data_json, datetime.now().isoformat(), unit_id)
+                _SQL_UPSERT_MATERIAL_BALANCE,
+                (unit_id, balance.balance_status, calculated_data_json, now, now)
             )
-            self.db.connection.commit()
+            self.calculation_cache[('material_balance', unit_id)] = (key, results)
             
-            # 发出计算完成信号
-            self.calculation_completed.emit('material_balance', {
+            # 记录计算结果，提交后统一发出计算完成信号
+            self._completed_calculations.append(('material_balance', {
                 'unit_id': unit_id,
                 'results': results,
                 'status': balance.balance_status
-            })
+            }))
             
-            print(f"物料平衡计算完成: 单元 {unit_id}, 状态: {balance.balance_status}")
+            logger.debug("物料平衡计算完成: 单元 %s, 状态: %s", unit_id, balance.balance_status)
             
         except Exception as e:
-            print(f"计算物料平衡失败 {unit_id}: {e}")
+            logger.exception("计算物料平衡失败 %s: %s", unit_id, e)
             
     def _calculate_heat_balance_for_unit(self, unit_id: str):
         """计算单元的热量平衡"""
         try:
             # 获取单元信息
-            unit_data = self.db.execute_query(
-                "SELECT * FROM process_flow WHERE unit_id = ?", 
-                (unit_id,)
-            )
+            unit_data = self.db.execute_query(_SQL_SELECT_UNIT, (unit_id,))
             
             if not unit_data:
                 return
@@ -331,16 +982,22 @@ class DataSyncEngine(QObject):
             unit = ProcessUnit.from_dict(unit_data[0])
             
             # 获取单元的输入输出流
-            streams = self.db.execute_query(
-                """SELECT * FROM process_materials 
-                WHERE source_unit = ? OR destination_unit = ?""",
-                (unit_id, unit_id)
-            )
-            
-            # 获取物料参数
-            all_materials = self.db.get_all_materials()
-            material_dict = {mat.material_id: mat for mat in all_materials}
+            streams = self._streams_for_unit(unit_id)
             
+            # 反应热和组分比热同样影响结果，一并计入哈希键
+            self._ensure_dependencies()
+            material_dict = self._materials()
+            cp_values = sorted(
+                (material_id, material_dict[material_id].specific_heat)
+                for row in streams
+                for material_id in self._stream_materials.get(row['stream_id'], ())
+                if material_id in material_dict
+            )
+            key = self._balance_key('heat_balance', unit_id, streams, 
+                                    (unit_data[0].get('parameters_json'), cp_values))
+            if self._cached_result('heat_balance', unit_id, key) is not None:
+                return
+                
             # 计算热量平衡
             total_input_heat = 0.0
             total_output_heat = 0.0
@@ -348,48 +1005,40 @@ class DataSyncEngine(QObject):
             input_heat_sources = {}
             output_heat_sources = {}
             
-            # 计算流股的显热
-            for stream_data in streams:
-                stream = ProcessMaterial.from_dict(stream_data)
+            # 筛选参与计算的流股（温度、流量、组成均非空），未缓存显热的流股批量计算
+            soa = self._build_soa(unit_id)
+            rows = self._heat_rows(soa)
+            uncached = np.array(
+                [i for i in rows if soa.stream_ids[i] not in self._stream_heat], dtype=np.intp
+            )
+            if len(uncached):
+                self._stream_heat.update(self._compute_stream_heats(soa, uncached))
                 
-                if not stream.temperature or not stream.flow_rate or not stream.composition:
-                    continue
-                    
-                # 计算流股的热量
-                stream_heat = 0.0
-                for material_id, fraction in stream.composition.items():
-                    material = material_dict.get(material_id)
-                    if material and material.specific_heat and stream.flow_rate:
-                        # Q = m * Cp * ΔT (简化计算，假设参考温度25°C)
-                        delta_temp = stream.temperature - 25.0
-                        component_mass = stream.flow_rate * fraction / 3600  # kg/s
-                        heat = component_mass * material.specific_heat * delta_temp  # kW
-                        stream_heat += heat
-                        
-                if stream.destination_unit == unit_id:  # 输入流
-                    input_heat_sources[f"stream_{stream.stream_id}"] = stream_heat
-                    total_input_heat += stream_heat
-                elif stream.source_unit == unit_id:  # 输出流
-                    output_heat_sources[f"stream_{stream.stream_id}"] = stream_heat
-                    total_output_heat += stream_heat
+            # 计算流股的显热
+            heats = np.array([self._stream_heat[soa.stream_ids[i]] for i in rows], dtype=np.float64)
+            is_input = soa.is_input[rows]
+            for i, stream_heat, from_input in zip(rows, heats, is_input):
+                if from_input:  # 输入流
+                    input_heat_sources[f"stream_{soa.stream_ids[i]}"] = float(stream_heat)
+                else:  # 输出流
+                    output_heat_sources[f"stream_{soa.stream_ids[i]}"] = float(stream_heat)
                     
+            total_input_heat, total_output_heat = split_totals(heats, is_input)
+            
             # 考虑反应热（如果有）
             reaction_heat = unit.parameters.get('reaction_heat', 0) if hasattr(unit, 'parameters') else 0
             if reaction_heat:
                 input_heat_sources['reaction'] = reaction_heat
                 total_input_heat += reaction_heat
                 
-            # 计算热损失（假设为输入热量的5%）
-            heat_loss = total_input_heat * 0.05
+            # 计算热损失（假设为输入热量的5%）和热效率（有效热量即不含热损失的输出热量）
+            heat_loss = HEAT_LOSS_FRACTION * total_input_heat
             output_heat_sources['heat_loss'] = heat_loss
+            efficiency = total_output_heat / total_input_heat * 100.0 if total_input_heat > 0 else None
             total_output_heat += heat_loss
+            difference = total_output_heat - total_input_heat
+            is_balanced = abs(difference) < 0.01
             
-            # 计算热效率
-            efficiency = None
-            if total_input_heat > 0:
-                useful_heat = total_output_heat - heat_loss
-                efficiency = (useful_heat / total_input_heat) * 100 if total_input_heat > 0 else 0
-                
             # 创建热量平衡对象
             heat_balance = HeatBalance(
                 unit_id=unit_id,
@@ -397,16 +1046,16 @@ class DataSyncEngine(QObject):
                 output_heat=output_heat_sources,
                 heat_loss=heat_loss,
                 efficiency=efficiency,
-                balance_status='calculated' if abs(total_output_heat - total_input_heat) < 0.01 else 'unbalanced'
+                balance_status='calculated' if is_balanced else 'unbalanced'
             )
             
             # 保存计算结果
             calculated_data = {
                 'total_input': total_input_heat,
                 'total_output': total_output_heat,
-                'difference': total_output_heat - total_input_heat,
+                'difference': difference,
                 'efficiency': efficiency,
-                'is_balanced': abs(total_output_heat - total_input_heat) < 0.01
+                'is_balanced': is_balanced
             }
             
             heat_balance.calculated_data = calculated_data
@@ -414,100 +1063,80 @@ class DataSyncEngine(QObject):
             # 保存到数据库
             heat_dict = heat_balance.to_dict()
             
-            # 检查是否已存在记录
-            existing = self.db.execute_query(
-                "SELECT id FROM heat_balance WHERE unit_id = ?", 
-                (unit_id,)
+            # 插入或更新记录（已存在时保留创建时间）
+            now = self._timestamp()
+            self.db.cursor.execute(
+                _SQL_UPSERT_HEAT_BALANCE,
+                (
+                    unit_id,
+                    heat_dict['input_heat_json'],
+                    heat_dict['output_heat_json'],
+                    heat_dict['heat_loss'],
+                    heat_dict['efficiency'],
+                    heat_dict['utility_requirements_json'],
+                    heat_dict['calculated_data_json'],
+                    heat_dict['balance_status'],
+                    now,
+                    now
+                )
             )
             
-            if existing:
-                # 更新现有记录
-                self.db.cursor.execute(
-                    """UPDATE heat_balance 
-                    SET input_heat_json = ?, output_heat_json = ?, heat_loss = ?, 
-                        efficiency = ?, utility_requirements_json = ?, 
-                        calculated_data_json = ?, balance_status = ?, modified_date = ?
-                    WHERE unit_id = ?""",
-                    (
-                        heat_dict['input_heat_json'],
-                        heat_dict['output_heat_json'],
-                        heat_dict['heat_loss'],
-                        heat_dict['efficiency'],
-                        heat_dict['utility_requirements_json'],
-                        heat_dict['calculated_data_json'],
-                        heat_dict['balance_status'],
-                        datetime.now().isoformat(),
-                        unit_id
-                    )
-                )
-            else:
-                # 插入新记录
-                self.db.cursor.execute(
-                    """INSERT INTO heat_balance 
-                    (unit_id, input_heat_json, output_heat_json, heat_loss, 
-                     efficiency, utility_requirements_json, calculated_data_json, 
-                     balance_status, created_date, modified_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        unit_id,
-                        heat_dict['input_heat_json'],
-                        heat_dict['output_heat_json'],
-                        heat_dict['heat_loss'],
-                        heat_dict['efficiency'],
-                        heat_dict['utility_requirements_json'],
-                        heat_dict['calculated_data_json'],
-                        heat_dict['balance_status'],
-                        datetime.now().isoformat(),
-                        datetime.now().isoformat()
-                    )
-                )
-                
-            self.db.connection.commit()
+            self.calculation_cache[('heat_balance', unit_id)] = (key, calculated_data)
             
-            # 发出计算完成信号
-            self.calculation_completed.emit('heat_balance', {
+            # 记录计算结果，提交后统一发出计算完成信号
+            self._completed_calculations.append(('heat_balance', {
                 'unit_id': unit_id,
                 'results': calculated_data,
                 'status': heat_balance.balance_status
-            })
+            }))
             
-            print(f"热量平衡计算完成: 单元 {unit_id}, 状态: {heat_balance.balance_status}")
+            logger.debug("热量平衡计算完成: 单元 %s, 状态: %s", unit_id, heat_balance.balance_status)
             
         except Exception as e:
-            print(f"计算热量平衡失败 {unit_id}: {e}")
+            logger.exception("计算热量平衡失败 %s: %s", unit_id, e)
             
+    @staticmethod
+    def _heat_rows(soa: StreamSoA) -> np.ndarray:
+        """参与热量计算的流股行号（温度、流量、组成均非空）"""
+        return np.flatnonzero((soa.temperatures != 0) & (soa.flow_rates != 0) & soa.has_composition)
+        
+    def _compute_stream_heats(self, soa: StreamSoA, rows: np.ndarray) -> Dict[str, float]:
+        """
+        批量计算流股显热 (kW)
+        
+        Q = m * Cp * ΔT (简化计算，假设参考温度25°C)，
+        组成矩阵 (流股 × 组分) 与组分比热向量交由数值内核一次计算所有流股
+        """
+        mat_idx, cp_vec = self._material_vectors()
+        
+        # 未登记物料参数的组分比热按0计
+        cp_local = np.array(
+            [cp_vec[mat_idx[material_id]] if material_id in mat_idx else 0.0 for material_id in soa.components],
+            dtype=np.float64
+        )
+        heats = stream_heats(
+            soa.flow_rates[rows], soa.temperatures[rows], soa.comp_matrix[rows], cp_local
+        )  # kW
+        
+        return {soa.stream_ids[i]: float(heat) for i, heat in zip(rows, heats)}
+        
     def _calculate_water_balance_for_unit(self, unit_id: str):
         """计算单元的水平衡"""
         try:
-            # 获取与水相关的流股
-            streams = self.db.execute_query(
-                """SELECT * FROM process_materials 
-                WHERE (source_unit = ? OR destination_unit = ?) 
-                AND (composition_json LIKE '%water%' OR name LIKE '%水%')""",
-                (unit_id, unit_id)
+            # 获取与水相关的流股（is_water 由数据库触发器维护）
+            streams = [row for row in self._streams_for_unit(unit_id) if row['is_water']]
+            
+            key = self._balance_key('water_balance', unit_id, streams)
+            if self._cached_result('water_balance', unit_id, key) is not None:
+                return
+                
+            # 水含量（简化：组成中的water，或名称含“水”的纯水流股）在构建列式视图时已确定
+            soa = self._build_soa(unit_id)
+            rows = soa.is_water & (soa.flow_rates != 0)
+            water_input, water_output = water_totals(
+                soa.flow_rates[rows], soa.water_fractions[rows], soa.is_input[rows]
             )
             
-            water_input = 0.0
-            water_output = 0.0
-            water_consumption = 0.0
-            
-            for stream_data in streams:
-                stream = ProcessMaterial.from_dict(stream_data)
-                if stream.flow_rate:
-                    # 计算水含量（简化：假设流股名称或组成中包含水）
-                    water_content = 0.0
-                    if 'water' in stream.composition:
-                        water_content = stream.composition['water']
-                    elif '水' in stream.name:
-                        water_content = 1.0  # 假设纯水流股
-                        
-                    water_flow = stream.flow_rate * water_content
-                    
-                    if stream.destination_unit == unit_id:  # 输入
-                        water_input += water_flow
-                    elif stream.source_unit == unit_id:  # 输出
-                        water_output += water_flow
-                        
             # 计算水消耗
             water_consumption = water_input - water_output
             
@@ -521,88 +1150,68 @@ class DataSyncEngine(QObject):
                 'reuse_possibilities': '待分析'
             }
             
-            # 保存到数据库
-            existing = self.db.execute_query(
-                "SELECT id FROM water_balance WHERE unit_id = ?", 
-                (unit_id,)
+            # 保存到数据库（已存在时保留创建时间）
+            now = self._timestamp()
+            self.db.cursor.execute(
+                _SQL_UPSERT_WATER_BALANCE,
+                (
+                    unit_id,
+                    water_balance_data['fresh_water_in'],
+                    water_balance_data['recycled_water_in'],
+                    water_balance_data['water_consumption'],
+                    water_balance_data['wastewater_out'],
+                    water_balance_data['reuse_possibilities'],
+                    now,
+                    now
+                )
             )
             
-            if existing:
-                self.db.cursor.execute(
-                    """UPDATE water_balance 
-                    SET fresh_water_in = ?, recycled_water_in = ?, water_consumption = ?, 
-                        wastewater_out = ?, reuse_possibilities = ?, modified_date = ?
-                    WHERE unit_id = ?""",
-                    (
-                        water_balance_data['fresh_water_in'],
-                        water_balance_data['recycled_water_in'],
-                        water_balance_data['water_consumption'],
-                        water_balance_data['wastewater_out'],
-                        water_balance_data['reuse_possibilities'],
-                        datetime.now().isoformat(),
-                        unit_id
-                    )
-                )
-            else:
-                self.db.cursor.execute(
-                    """INSERT INTO water_balance 
-                    (unit_id, fresh_water_in, recycled_water_in, water_consumption, 
-                     wastewater_out, reuse_possibilities, created_date, modified_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        unit_id,
-                        water_balance_data['fresh_water_in'],
-                        water_balance_data['recycled_water_in'],
-                        water_balance_data['water_consumption'],
-                        water_balance_data['wastewater_out'],
-                        water_balance_data['reuse_possibilities'],
-                        datetime.now().isoformat(),
-                        datetime.now().isoformat()
-                    )
-                )
-                
-            self.db.connection.commit()
+            self.calculation_cache[('water_balance', unit_id)] = (key, water_balance_data)
             
-            # 发出计算完成信号
-            self.calculation_completed.emit('water_balance', {
+            # 记录计算结果，提交后统一发出计算完成信号
+            self._completed_calculations.append(('water_balance', {
                 'unit_id': unit_id,
                 'results': water_balance_data,
                 'status': 'calculated'
-            })
+            }))
             
-            print(f"水平衡计算完成: 单元 {unit_id}")
+            logger.debug("水平衡计算完成: 单元 %s", unit_id)
             
         except Exception as e:
-            print(f"计算水平衡失败 {unit_id}: {e}")
+            logger.exception("计算水平衡失败 %s: %s", unit_id, e)
             
     # ========== 辅助方法 ==========
     
     def _remove_material_from_streams(self, material_id: str):
         """从流股中移除物料"""
-        streams = self.db.execute_query(
-            "SELECT * FROM process_materials WHERE composition_json LIKE ?",
-            (f'%{material_id}%',)
-        )
+        self._ensure_dependencies()
+        stream_ids = list(self._material_streams.get(material_id, ()))
+        if not stream_ids:
+            return
+            
+        streams = self.db.execute_query(_SQL_SELECT_STREAM_COMPOSITIONS, (fast_json.dumps(stream_ids),))
         
+        loads = fast_json.loads
+        stream_materials = self._stream_materials
+        rows = []
         for stream_data in streams:
-            stream = ProcessMaterial.from_dict(stream_data)
-            if material_id in stream.composition:
-                del stream.composition[material_id]
+            composition = loads(stream_data['composition_json'] or '{}')
+            if material_id in composition:
+                del composition[material_id]
+                stream_materials.get(stream_data['stream_id'], set()).discard(material_id)
                 
                 # 重新归一化组成
-                total = sum(stream.composition.values())
+                total = sum(composition.values())
                 if total > 0:
-                    for comp_id in stream.composition:
-                        stream.composition[comp_id] /= total
+                    for comp_id in composition:
+                        composition[comp_id] /= total
                         
-                # 更新数据库
-                self.db.cursor.execute(
-                    "UPDATE process_materials SET composition_json = ? WHERE stream_id = ?",
-                    (json.dumps(stream.composition, ensure_ascii=False), stream.stream_id)
-                )
+                rows.append((fast_json.dumps(composition), stream_data['stream_id']))
                 
-        self.db.connection.commit()
+        # 批量更新数据库（stream_composition 由触发器同步更新）
+        self.db.cursor.executemany(_SQL_UPDATE_STREAM_COMPOSITION, rows)
         
+
     def _update_streams_with_material(self, material_id: str, material_data: Dict[str, Any]):
         """使用新物料数据更新流股"""
         # 这里可以更新流股的物性计算
@@ -610,141 +1219,117 @@ class DataSyncEngine(QObject):
         
     def _mark_balance_for_recalculation(self, material_id: str):
         """标记使用该物料的平衡需要重新计算"""
-        # 查找使用该物料的物料平衡
-        balances = self.db.execute_query(
-            "SELECT unit_id FROM material_balance WHERE calculated_data_json LIKE ?",
-            (f'%{material_id}%',)
-        )
-        
-        for balance in balances:
-            unit_id = balance['unit_id']
-            self.db.cursor.execute(
-                "UPDATE material_balance SET balance_status = 'needs_recalculation' WHERE unit_id = ?",
-                (unit_id,)
-            )
+        # 通过依赖图查找使用该物料的单元
+        for unit_id in self._units_for_material(material_id):
+            self.db.cursor.execute(_SQL_MARK_MATERIAL_BALANCE_STALE, (unit_id,))
             
-        self.db.connection.commit()
-        
     def _recalculate_material_balances(self, material_id: str, material_data: Dict[str, Any]):
         """重新计算相关物料平衡"""
-        # 查找使用该物料的流股
-        streams = self.db.execute_query(
-            "SELECT stream_id FROM process_materials WHERE composition_json LIKE ?",
-            (f'%{material_id}%',)
-        )
-        
-        processed_units = set()
-        
-        for stream_data in streams:
-            stream_id = stream_data['stream_id']
-            stream = self.db.get_process_material(stream_id)
-            if stream:
-                # 查找相关单元
-                units = []
-                if stream.source_unit:
-                    units.append(stream.source_unit)
-                if stream.destination_unit:
-                    units.append(stream.destination_unit)
-                    
-                for unit_id in units:
-                    if unit_id not in processed_units:
-                        self._calculate_material_balance_for_unit(unit_id)
-                        processed_units.add(unit_id)
+        for unit_id in self._units_for_material(material_id):
+            self._mark_dirty('material_balance', unit_id)
                         
     def _recalculate_heat_balances_for_material(self, material_id: str, material_data: Dict[str, Any]):
         """重新计算相关热量平衡"""
-        streams = self.db.execute_query(
-            "SELECT stream_id FROM process_materials WHERE composition_json LIKE ?",
-            (f'%{material_id}%',)
-        )
-        
-        processed_units = set()
-        
-        for stream_data in streams:
-            stream_id = stream_data['stream_id']
-            stream = self.db.get_process_material(stream_id)
-            if stream:
-                units = []
-                if stream.source_unit:
-                    units.append(stream.source_unit)
-                if stream.destination_unit:
-                    units.append(stream.destination_unit)
-                    
-                for unit_id in units:
-                    if unit_id not in processed_units:
-                        self._calculate_heat_balance_for_unit(unit_id)
-                        processed_units.add(unit_id)
+        for unit_id in self._units_for_material(material_id):
+            self._mark_dirty('heat_balance', unit_id)
                         
     def _find_units_for_stream(self, stream_id: str, stream: Optional[ProcessMaterial] = None) -> List[str]:
         """查找与流股相关的单元"""
-        units = []
-        
-        if not stream:
-            stream_data = self.db.execute_query(
-                "SELECT * FROM process_materials WHERE stream_id = ?",
-                (stream_id,)
-            )
-            if stream_data:
-                stream = ProcessMaterial.from_dict(stream_data[0])
-                
         if stream:
-            if stream.source_unit:
-                units.append(stream.source_unit)
-            if stream.destination_unit:
-                units.append(stream.destination_unit)
+            endpoints = (stream.source_unit, stream.destination_unit)
+        else:
+            endpoints = self._stream_endpoints.get(stream_id)
+            if endpoints is None:
+                stream_data = self.db.execute_query(_SQL_SELECT_STREAM_ENDPOINTS, (stream_id,))
+                if not stream_data:
+                    return []
+                endpoints = (stream_data[0]['source_unit'], stream_data[0]['destination_unit'])
+                self._stream_endpoints[stream_id] = endpoints
                 
-        return units
+        return [unit_id for unit_id in endpoints if unit_id]
         
-    def _get_or_create_material_balance(self, unit_id: str) -> Optional[MaterialBalance]:
-        """获取或创建物料平衡记录"""
-        balance_data = self.db.execute_query(
-            "SELECT * FROM material_balance WHERE unit_id = ?",
-            (unit_id,)
-        )
+    def _get_or_create_balance_streams(self, unit_id: str) -> Tuple[Dict[str, None], Dict[str, None]]:
+        """
+        获取或创建物料平衡记录，返回其输入、输出流股ID
+        
+        流股ID以有序字典（值均为None）表示，增删和查找都是O(1)，且保持原有顺序
+        """
+        balance_data = self.db.execute_query(_SQL_SELECT_BALANCE_STREAMS, (unit_id,))
         
         if balance_data:
-            return MaterialBalance.from_dict(balance_data[0])
+            row = balance_data[0]
+            input_streams = fast_json.loads(row['input_streams_json']) if row['input_streams_json'] else []
+            output_streams = fast_json.loads(row['output_streams_json']) if row['output_streams_json'] else []
+            return dict.fromkeys(input_streams), dict.fromkeys(output_streams)
         else:
             # 创建新的物料平衡记录
-            balance = MaterialBalance(unit_id=unit_id)
-            self.db.cursor.execute(
-                """INSERT INTO material_balance 
-                (unit_id, balance_status, created_date, modified_date) 
-                VALUES (?, ?, ?, ?)""",
-                (unit_id, 'pending', datetime.now().isoformat(), datetime.now().isoformat())
-            )
-            self.db.connection.commit()
-            return balance
+            now = self._timestamp()
+            self.db.cursor.execute(_SQL_INSERT_MATERIAL_BALANCE, (unit_id, 'pending', now, now))
+            return {}, {}
             
-    def _update_balance_streams(self, balance: MaterialBalance, stream_id: str, 
+    def _update_balance_streams_in_db(self, unit_id: str, stream_id: str, operation: str,
+                                      stream: Optional[ProcessMaterial] = None):
+        """
+        在数据库中用JSON函数直接增删物料平衡的流股ID
+        
+        与 _update_balance_streams 的规则相同，但不需要将流股列表读入Python再整体写回
+        """
+        cursor = self.db.cursor
+        now = self._timestamp()
+        cursor.execute(_SQL_INSERT_MATERIAL_BALANCE_IF_MISSING, (unit_id, 'pending', now, now))
+        
+        if operation == 'delete':
+            for sql in _SQL_REMOVE_BALANCE_STREAM.values():
+                cursor.execute(sql, (stream_id, now, unit_id, stream_id))
+        elif operation in ['add', 'update'] and stream:
+            added = False
+            if stream.destination_unit == unit_id:
+                cursor.execute(
+                    _SQL_APPEND_BALANCE_STREAM['input_streams_json'],
+                    (stream_id, now, unit_id, stream_id)
+                )
+                added = cursor.rowcount > 0
+            if not added and stream.source_unit == unit_id:
+                cursor.execute(
+                    _SQL_APPEND_BALANCE_STREAM['output_streams_json'],
+                    (stream_id, now, unit_id, stream_id)
+                )
+                
+    def _update_balance_streams(self, unit_id: str, input_streams: Dict[str, None], 
+                               output_streams: Dict[str, None], stream_id: str,
                                operation: str, stream: Optional[ProcessMaterial] = None):
-        """更新物料平衡中的流股列表"""
+        """更新物料平衡中的流股列表（列表未变化时不写数据库）"""
+        changed = False
         if operation == 'delete':
-            if stream_id in balance.input_streams:
-                balance.input_streams.remove(stream_id)
-            if stream_id in balance.output_streams:
-                balance.output_streams.remove(stream_id)
+            if stream_id in input_streams:
+                del input_streams[stream_id]
+                changed = True
+            if stream_id in output_streams:
+                del output_streams[stream_id]
+                changed = True
         elif operation in ['add', 'update'] and stream:
-            if stream.destination_unit == balance.unit_id and stream_id not in balance.input_streams:
-                balance.input_streams.append(stream_id)
-            elif stream.source_unit == balance.unit_id and stream_id not in balance.output_streams:
-                balance.output_streams.append(stream_id)
+            if stream.destination_unit == unit_id and stream_id not in input_streams:
+                input_streams[stream_id] = None
+                changed = True
+            elif stream.source_unit == unit_id and stream_id not in output_streams:
+                output_streams[stream_id] = None
+                changed = True
                 
+        if not changed:
+            return
+            
         # 更新数据库
-        input_json = json.dumps(balance.input_streams, ensure_ascii=False)
-        output_json = json.dumps(balance.output_streams, ensure_ascii=False)
+        input_json = fast_json.dumps(list(input_streams))
+        output_json = fast_json.dumps(list(output_streams))
         
         self.db.cursor.execute(
-            """UPDATE material_balance 
-            SET input_streams_json = ?, output_streams_json = ?, modified_date = ?
-            WHERE unit_id = ?""",
-            (input_json, output_json, datetime.now().isoformat(), balance.unit_id)
+            _SQL_UPDATE_BALANCE_STREAMS,
+            (input_json, output_json, self._timestamp(), unit_id)
         )
-        self.db.connection.commit()
         
     def _is_water_stream(self, stream: ProcessMaterial) -> bool:
-        """检查是否是水流股"""
-        if 'water' in stream.composition or '水' in stream.name.lower():
+        """检查是否是水流股（与数据库中 is_water 列的规则一致）"""
+        if 'water' in stream.composition or '水' in stream.name:
             return True
         return False
         
@@ -752,14 +1337,8 @@ class DataSyncEngine(QObject):
         """更新工艺路线图中的连接"""
         if stream.source_unit and stream.destination_unit:
             # 查找源单元和目标单元
-            source_unit = self.db.execute_query(
-                "SELECT * FROM process_flow WHERE unit_id = ?",
-                (stream.source_unit,)
-            )
-            dest_unit = self.db.execute_query(
-                "SELECT * FROM process_flow WHERE unit_id = ?",
-                (stream.destination_unit,)
-            )
+            source_unit = self.db.execute_query(_SQL_SELECT_UNIT, (stream.source_unit,))
+            dest_unit = self.db.execute_query(_SQL_SELECT_UNIT, (stream.destination_unit,))
             
             if source_unit and dest_unit:
                 # 这里可以更新工艺路线图中的连接关系
@@ -769,16 +1348,7 @@ class DataSyncEngine(QObject):
     def _create_equipment_from_unit(self, unit_id: str, unit_data: Dict[str, Any]):
         """从工艺单元创建设备"""
         unit_type = unit_data.get('type', '')
-        equipment_type_map = {
-            'reactor': '反应器',
-            'separator': '分离器',
-            'heatex': '换热器',
-            'pump': '泵',
-            'compressor': '压缩机',
-            'tank': '储罐'
-        }
-        
-        equipment_type = equipment_type_map.get(unit_type, '设备')
+        equipment_type = EQUIPMENT_TYPE_MAP.get(unit_type, '设备')
         
         equipment = EquipmentItem(
             equipment_id=f"EQ-{unit_id}",
@@ -792,61 +1362,46 @@ class DataSyncEngine(QObject):
             }
         )
         
-        self.db.add_equipment(equipment)
+        # 直接插入而不经过 DatabaseManager.add_equipment，避免其单独提交或出错时回滚整个 flush 事务
+        self.db.cursor.execute(_SQL_INSERT_EQUIPMENT_IF_MISSING, equipment.to_dict())
+        self._commit()
         
     def _update_equipment_from_unit(self, unit_id: str, unit_data: Dict[str, Any]):
         """从工艺单元更新设备"""
         equipment_id = f"EQ-{unit_id}"
-        equipment_data = self.db.execute_query(
-            "SELECT * FROM equipment_list WHERE equipment_id = ?",
-            (equipment_id,)
+        # 设备不存在或名称、描述均未变化时不更新任何行
+        self.db.cursor.execute(
+            _SQL_UPDATE_EQUIPMENT_FROM_UNIT,
+            {
+                'unit_name': unit_data.get('name', ''),
+                'description': unit_data.get('description', ''),
+                'modified_date': self._timestamp(),
+                'equipment_id': equipment_id
+            }
         )
-        
-        if equipment_data:
-            # 更新现有设备
-            equipment = EquipmentItem.from_dict(equipment_data[0])
-            equipment.name = f"{unit_data.get('name', '')} - {equipment.type}"
-            equipment.specifications['description'] = unit_data.get('description', '')
-            
-            self.db.cursor.execute(
-                """UPDATE equipment_list 
-                SET name = ?, specifications_json = ?, modified_date = ?
-                WHERE equipment_id = ?""",
-                (
-                    equipment.name,
-                    json.dumps(equipment.specifications, ensure_ascii=False),
-                    datetime.now().isoformat(),
-                    equipment_id
-                )
-            )
-            self.db.connection.commit()
+        self._commit()
             
     def _delete_equipment_for_unit(self, unit_id: str):
         """删除与单元相关的设备"""
         equipment_id = f"EQ-{unit_id}"
-        self.db.cursor.execute(
-            "DELETE FROM equipment_list WHERE equipment_id = ?",
-            (equipment_id,)
-        )
-        self.db.connection.commit()
+        self.db.cursor.execute(_SQL_DELETE_EQUIPMENT, (equipment_id,))
+        self._commit()
         
     def _create_material_balance_for_unit(self, unit_id: str, unit_data: Dict[str, Any]):
         """为工艺单元创建物料平衡记录"""
-        balance = MaterialBalance(unit_id=unit_id)
-        self.db.add_material_balance(balance)
+        now = self._timestamp()
+        self.db.cursor.execute(_SQL_INSERT_MATERIAL_BALANCE_IF_MISSING, (unit_id, 'pending', now, now))
+        self._commit()
         
     def _find_units_for_equipment(self, equipment_id: str) -> List[str]:
         """查找与设备相关的单元"""
         # 从设备规格中提取源单元
-        equipment_data = self.db.execute_query(
-            "SELECT specifications_json FROM equipment_list WHERE equipment_id = ?",
-            (equipment_id,)
-        )
+        equipment_data = self.db.execute_query(_SQL_SELECT_EQUIPMENT_SPECS, (equipment_id,))
         
         units = []
         if equipment_data and equipment_data[0]['specifications_json']:
             try:
-                specs = json.loads(equipment_data[0]['specifications_json'])
+                specs = fast_json.loads(equipment_data[0]['specifications_json'])
                 source_unit = specs.get('source_unit')
                 if source_unit:
                     units.append(source_unit)
@@ -857,59 +1412,74 @@ class DataSyncEngine(QObject):
         
     def calculate_all_balances(self):
         """计算所有单元的平衡"""
-        # 获取所有工艺单元
-        units = self.db.get_all_process_units()
-        
-        for unit in units:
-            if hasattr(unit, 'unit_id'):
-                print(f"计算单元 {unit.unit_id} 的平衡...")
-                self._calculate_material_balance_for_unit(unit.unit_id)
-                self._calculate_heat_balance_for_unit(unit.unit_id)
-                self._calculate_water_balance_for_unit(unit.unit_id)
+        # 只需要单元ID，不必构造完整的工艺单元对象
+        unit_ids = [row['unit_id'] for row in self.db.execute_query(_SQL_SELECT_UNIT_IDS)]
+        
+        # 全量计算时重新加载依赖图并清空计算缓存，避免使用在同步引擎之外修改过的缓存数据
+        self._invalidate_dependencies()
+        self.calculation_cache.clear()
+        
+        for unit_id in unit_ids:
+            self._mark_dirty('material_balance', unit_id)
+            self._mark_dirty('heat_balance', unit_id)
+            self._mark_dirty('water_balance', unit_id)
                 
-        print("所有平衡计算完成")
+        # 与队列中尚未处理的同步请求一起在同一事务中计算
+        self.flush()
+        logger.info("所有平衡计算完成")
         
     def calculate_data_hash(self, data: Dict[str, Any]) -> str:
-        """计算数据哈希值"""
-        data_str = json.dumps(data, sort_keys=True)
-        return hashlib.md5(data_str.encode('utf-8')).hexdigest()
+        """计算数据哈希值（128位blake2b，与原MD5摘要同为32个十六进制字符）"""
+        data_str = fast_json.dumps(data, sort_keys=True)
+        return hashlib.blake2b(data_str.encode('utf-8'), digest_size=16).hexdigest()
         
     def record_data_change(self, module_name: str, data_id: str, change_type: str, 
                           changed_by: str = 'system'):
-        """记录数据变更"""
+        """
+        记录数据变更
+        
+        记录先缓存在内存中，随下一次 flush 的事务批量写入；
+        积累达到 VERSION_BATCH_SIZE 条时立即写入。
+        """
         try:
-            query = """
-                INSERT INTO data_versions 
-                (module_name, version, data_hash, change_description, changed_by, changed_date)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """
-            
-            # 获取当前版本
-            version_query = """
-                SELECT MAX(version) as max_version 
-                FROM data_versions 
-                WHERE module_name = ? AND data_hash LIKE ?
-            """
-            hash_pattern = f"{data_id}%"
-            result = self.db.execute_query(version_query, (module_name, hash_pattern))
-            
-            current_version = 1
-            if result and result[0]['max_version']:
-                current_version = result[0]['max_version'] + 1
+            # 获取当前版本（优先使用缓存的版本号）
+            version_key = (module_name, data_id)
+            last_version = self._versions.get(version_key)
+            if last_version is None:
+                result = self.db.execute_query(_SQL_SELECT_MAX_VERSION, (module_name, data_id))
+                last_version = result[0]['max_version'] if result and result[0]['max_version'] else 0
                 
-            # 生成数据哈希
-            data_hash = f"{data_id}_{self.calculate_data_hash({'id': data_id, 'type': change_type})}"
+            current_version = last_version + 1
             
-            self.db.cursor.execute(query, (
+            # 生成数据哈希（内容只有ID和变更类型，直接哈希拼接的字符串，不经过JSON序列化）
+            digest = hashlib.blake2b(f"{data_id}|{change_type}".encode('utf-8'), digest_size=16).hexdigest()
+            data_hash = f"{data_id}_{digest}"
+            
+            self._pending_versions.append((
                 module_name,
+                data_id,
                 current_version,
                 data_hash,
                 f"{change_type} operation",
                 changed_by,
-                datetime.now().isoformat()
+                self._timestamp()
             ))
+            self._versions[version_key] = current_version
             
-            self.db.connection.commit()
+            if self._in_batch:
+                return
+            if len(self._pending_versions) >= VERSION_BATCH_SIZE:
+                self._write_pending_versions()
+                self._commit()
+            else:
+                self._schedule_flush()
             
         except Exception as e:
-            print(f"记录数据变更失败: {e}")
\ No newline at end of file
+            logger.exception("记录数据变更失败: %s", e)
+            
+    def _write_pending_versions(self):
+        """将缓存的数据版本记录一次性写入 data_versions"""
+        if not self._pending_versions:
+            return
+        self.db.cursor.executemany(_SQL_INSERT_DATA_VERSION, self._pending_versions)
+        self._pending_versions.clear()
\ No newline at end of file
@@ -3,260 +3,632 @@
 import sqlite3
 import json
 import os
-from typing import Dict, List, Any, Optional, Tuple, Union
+import queue
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import fields
+from functools import lru_cache
+from typing import Dict, List, Any, Iterator, Optional, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 
-from config import DB_CONFIG
+from config import DB_CONFIG, create_directories, ensure_dir
+from . import fast_json
 from .models import *
 
+# 在线备份每步复制的页数（默认4KB页时约4MB）
+BACKUP_PAGES_PER_STEP = 1024
+
+# SQLite计算的当前本地时间，格式与 datetime.now().isoformat() 相同（精确到毫秒）
+_SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+# 流式读取（iter_module_data / iter_query / export_to_json）每次 fetchmany 的行数
+FETCH_BATCH_SIZE = 1000
+
+# 只读连接池的最大连接数（按需创建）
+READ_POOL_SIZE = os.cpu_count() or 4
+
+# 只读连接池已满时等待其他线程归还连接的最长时间（秒）
+READ_POOL_TIMEOUT = 30
+
+# project_info表中唯一一行项目信息的id
+PROJECT_INFO_ID = 1
+
+# 查询中以 "列名 [JSON]" 声明的列由sqlite3在取行时直接解码（配合 PARSE_COLNAMES）
+sqlite3.register_converter("JSON", fast_json.loads)
+# "列名 [BOOL]"：整数0/1或旧数据中的 'true'/'yes' 文本，与 MaterialParameter.from_dict 的处理一致
+sqlite3.register_converter("BOOL", lambda value: value.lower() in (b'1', b'true', b'yes'))
+
+# 被外键引用的父表，导入时先于子表处理（msds_data引用material_params，各平衡表引用process_flow）
+IMPORT_PARENT_TABLES = ('material_params', 'process_flow')
+
+
+@lru_cache(maxsize=None)
+def _insert_sql(table: str, columns: Tuple[str, ...]) -> str:
+    """按表名和列名生成INSERT语句（模型字段固定，每种组合只拼接一次）"""
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+
+@lru_cache(maxsize=None)
+def _update_sql(table: str, columns: Tuple[str, ...], key_column: str,
+                timestamp_column: Optional[str] = None) -> str:
+    """
+    按表名和列名生成按主键列更新的UPDATE语句，参数顺序为各列值后接主键值
+    
+    指定timestamp_column时该列由SQLite写入当前本地时间，不占用参数
+    """
+    set_clause = ', '.join(f"{column}=?" for column in columns)
+    if timestamp_column:
+        set_clause += f", {timestamp_column}={_SQL_NOW}"
+    return f"UPDATE {table} SET {set_clause} WHERE {key_column}=?"
+
+
+@lru_cache(maxsize=None)
+def _upsert_sql(table: str, columns: Tuple[str, ...], key_column: str) -> str:
+    """按表名和列名生成以key_column冲突时原地更新其余列的UPSERT语句"""
+    update_clause = ', '.join(f"{column}=excluded.{column}" for column in columns if column != key_column)
+    return (f"{_insert_sql(table, columns)} "
+            f"ON CONFLICT({key_column}) DO UPDATE SET {update_clause}")
+
+# 只读查询：以 SELECT 开头，或 WITH 开头且不含写操作关键字（SQLite允许 WITH ... DELETE 等写语句）
+_READ_QUERY_RE = re.compile(r"\s*(SELECT\b|WITH\b(?!.*\b(?:INSERT|UPDATE|DELETE|REPLACE)\b))",
+                            re.IGNORECASE | re.DOTALL)
+
+
+@lru_cache(maxsize=256)
+def _is_read_query(query: str) -> bool:
+    """判断是否为只读查询（按SQL文本缓存，轮询同一查询时不重复匹配）"""
+    return _READ_QUERY_RE.match(query) is not None
+
+# 数据库结构：建表及不依赖迁移的索引、触发器（均为 IF NOT EXISTS，可对旧数据库重复执行）。
+# 依赖旧数据库迁移（补加列）的索引和触发器在 initialize_database 中迁移之后创建
+SCHEMA_SQL = """
+-- 项目信息表
+CREATE TABLE IF NOT EXISTS project_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    version TEXT DEFAULT '1.0.0',
+    author TEXT,
+    company TEXT,
+    created_date TEXT,
+    modified_date TEXT
+);
+
+-- 物料参数表
+CREATE TABLE IF NOT EXISTS material_params (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    material_id TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    chemical_formula TEXT,
+    cas_number TEXT,  -- 新增：CAS号
+
+    -- 物性参数
+    molar_mass REAL,
+    density REAL,
+    viscosity REAL,
+    specific_heat REAL,
+    thermal_conductivity REAL,
+
+    -- 质量指标（基于硫酸标准）
+    sulfuric_acid_content_92 REAL,  -- 92酸含量 %
+    sulfuric_acid_content_98 REAL,  -- 98酸含量 %
+    nitrate_content REAL,           -- 硝酸盐含量 %
+    chloride_content REAL,          -- 氯化物含量 %
+    iron_content REAL,              -- 铁含量 %
+    lead_content REAL,              -- 铅含量 mg/kg
+    arsenic_content REAL,           -- 砷含量 mg/kg
+    selenium_content REAL,          -- 硒含量 mg/kg
+    reducing_substances BOOLEAN,    -- 还原性物质检测
+
+    -- 安全信息
+    safety_class TEXT,
+    storage_conditions TEXT,
+    hazard_classification TEXT,     -- 危险分类
+
+    properties_json TEXT,
+    created_date TEXT,
+    modified_date TEXT
+);
+
+-- MSDS数据表
+CREATE TABLE IF NOT EXISTS msds_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    material_id TEXT NOT NULL,
+    msds_number TEXT,
+    hazard_classification TEXT,
+    precautionary_statements TEXT,
+    first_aid_measures TEXT,
+    fire_fighting_measures TEXT,
+    accidental_release_measures TEXT,
+    handling_and_storage TEXT,
+    exposure_controls TEXT,
+    stability_and_reactivity TEXT,
+    toxicological_information TEXT,
+    ecological_information TEXT,
+    disposal_considerations TEXT,
+    transport_information TEXT,
+    regulatory_information TEXT,
+    other_information TEXT,
+    FOREIGN KEY (material_id) REFERENCES material_params (material_id) ON DELETE CASCADE
+);
+
+-- 过程物料表
+CREATE TABLE IF NOT EXISTS process_materials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stream_id TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    phase TEXT,
+    temperature REAL,
+    pressure REAL,
+    flow_rate REAL,
+    composition_json TEXT,
+    source_unit TEXT,
+    destination_unit TEXT,
+    properties_json TEXT,
+    created_date TEXT,
+    modified_date TEXT,
+    is_water INTEGER DEFAULT 0
+);
+
+-- 流股组成反向索引表（物料 -> 流股），由process_materials上的触发器维护
+CREATE TABLE IF NOT EXISTS stream_composition (
+    stream_id TEXT NOT NULL,
+    material_id TEXT NOT NULL,
+    fraction REAL,
+    PRIMARY KEY (stream_id, material_id)
+);
+
+-- 工艺路线表
+CREATE TABLE IF NOT EXISTS process_flow (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit_id TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    description TEXT,
+    position_x REAL,
+    position_y REAL,
+    connections_json TEXT,
+    parameters_json TEXT,
+    created_date TEXT,
+    modified_date TEXT
+);
+
+-- 设备清单表
+CREATE TABLE IF NOT EXISTS equipment_list (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    equipment_id TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    model TEXT,
+    specifications_json TEXT,
+    quantity INTEGER,
+    material_of_construction TEXT,
+    operating_conditions_json TEXT,
+    utility_requirements_json TEXT,
+    manufacturer TEXT,
+    created_date TEXT,
+    modified_date TEXT
+);
+
+-- 物料平衡表（更新）
+CREATE TABLE IF NOT EXISTS material_balance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit_id TEXT UNIQUE NOT NULL,
+    input_streams_json TEXT,
+    output_streams_json TEXT,
+    conversion_rate REAL,
+    yield REAL,
+    losses_json TEXT,
+    calculated_data_json TEXT,
+    balance_status TEXT DEFAULT 'pending',
+    tolerance REAL DEFAULT 0.01,
+    created_date TEXT,
+    modified_date TEXT,
+    FOREIGN KEY (unit_id) REFERENCES process_flow (unit_id) ON DELETE CASCADE
+);
+
+-- 热量平衡表（更新）
+CREATE TABLE IF NOT EXISTS heat_balance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit_id TEXT UNIQUE NOT NULL,
+    input_heat_json TEXT,
+    output_heat_json TEXT,
+    heat_loss REAL,
+    efficiency REAL,
+    utility_requirements_json TEXT,
+    calculated_data_json TEXT,
+    balance_status TEXT DEFAULT 'pending',
+    created_date TEXT,
+    modified_date TEXT,
+    FOREIGN KEY (unit_id) REFERENCES process_flow (unit_id) ON DELETE CASCADE
+);
+
+-- 水平衡表（更新）
+CREATE TABLE IF NOT EXISTS water_balance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit_id TEXT UNIQUE NOT NULL,
+    fresh_water_in REAL,
+    recycled_water_in REAL,
+    water_consumption REAL,
+    wastewater_out REAL,
+    reuse_possibilities TEXT,
+    calculated_data_json TEXT,
+    created_date TEXT,
+    modified_date TEXT,
+    FOREIGN KEY (unit_id) REFERENCES process_flow (unit_id) ON DELETE CASCADE
+);
+
+-- 数据版本控制表
+CREATE TABLE IF NOT EXISTS data_versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    module_name TEXT NOT NULL,
+    version INTEGER DEFAULT 1,
+    data_hash TEXT,
+    change_description TEXT,
+    changed_by TEXT,
+    changed_date TEXT,
+    data_id TEXT
+);
+
+-- 数据关系表（用于跟踪数据间的依赖关系）
+CREATE TABLE IF NOT EXISTS data_relationships (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_module TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    target_module TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    relationship_type TEXT,
+    created_date TEXT
+);
+
+-- 流股组成反向索引由process_materials上的触发器维护
+CREATE INDEX IF NOT EXISTS idx_stream_composition_material
+ON stream_composition (material_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_process_materials_insert
+AFTER INSERT ON process_materials
+BEGIN
+    INSERT OR REPLACE INTO stream_composition (stream_id, material_id, fraction)
+    SELECT NEW.stream_id, key, value
+    FROM json_each(CASE WHEN json_valid(NEW.composition_json) THEN NEW.composition_json ELSE '{}' END);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_process_materials_update
+AFTER UPDATE OF stream_id, composition_json ON process_materials
+BEGIN
+    DELETE FROM stream_composition WHERE stream_id = OLD.stream_id;
+    INSERT OR REPLACE INTO stream_composition (stream_id, material_id, fraction)
+    SELECT NEW.stream_id, key, value
+    FROM json_each(CASE WHEN json_valid(NEW.composition_json) THEN NEW.composition_json ELSE '{}' END);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_process_materials_delete
+AFTER DELETE ON process_materials
+BEGIN
+    DELETE FROM stream_composition WHERE stream_id = OLD.stream_id;
+END;
+
+-- 外键子表列和常用过滤列的索引（UNIQUE列已自带索引，平衡表的unit_id即如此）：
+-- 按物料查MSDS、删除物料时级联删除MSDS、按单元查流股、按模块和ID查数据关系。
+-- 流股的(源单元, 目标单元)复合索引同时覆盖按源单元查询和单元连接关系查询（无需回表），
+-- 取代旧版本的单列源单元索引
+CREATE INDEX IF NOT EXISTS idx_msds_material ON msds_data (material_id);
+DROP INDEX IF EXISTS idx_pm_source;
+CREATE INDEX IF NOT EXISTS idx_pm_source_destination ON process_materials (source_unit, destination_unit);
+CREATE INDEX IF NOT EXISTS idx_pm_destination ON process_materials (destination_unit);
+CREATE INDEX IF NOT EXISTS idx_rel_source ON data_relationships (source_module, source_id);
+CREATE INDEX IF NOT EXISTS idx_rel_target ON data_relationships (target_module, target_id);
+"""
+
 class DatabaseManager:
     """数据库管理器"""
     
-    def __init__(self, db_path: str):
+    # 模块名 -> (查询语句, 计数语句, 模型类)；模型没有from_row时直接返回行字典
+    _MODULE_SELECT = {
+        module_name: (f"SELECT * FROM {module_name}", f"SELECT COUNT(*) FROM {module_name}",
+                      model_class if hasattr(model_class, 'from_row') else None)
+        for module_name, model_class in (
+            ("material_params", MaterialParameter),
+            ("msds_data", MSDSData),
+            ("process_materials", ProcessMaterial),
+            ("process_flow", ProcessUnit),
+            ("equipment_list", EquipmentItem),
+            ("material_balance", MaterialBalance),
+        )
+    }
+    
+    # 模块名 -> 用于整表更新（UPSERT）的唯一键列；msds_data没有唯一的业务键，不支持整表更新
+    _MODULE_KEYS = {
+        "material_params": "material_id",
+        "process_materials": "stream_id",
+        "process_flow": "unit_id",
+        "equipment_list": "equipment_id",
+        "material_balance": "unit_id",
+    }
+    
+    def __init__(self, db_path: str, exclusive: bool = False):
         """
         初始化数据库管理器
         
         Args:
             db_path: 数据库文件路径
+            exclusive: 独占模式。写连接以 locking_mode=EXCLUSIVE 打开，首次访问后一直持有文件锁，
+                省去每次读写的文件加锁/解锁；此时其他连接（包括本对象的只读连接池）无法访问该数据库，
+                所有查询都经写连接执行。仅用于单进程、单线程（如只有UI线程）访问数据库的场合
         """
+        create_directories()
+        
         self.db_path = db_path
+        self.exclusive = exclusive
         self.connection = None
         self.cursor = None
+        # 处于 transaction() 块中时，单条操作不再各自提交/回滚
+        self._in_txn = False
+        # (表名, 查询条件/排序子句) -> 按模型字段选取的查询语句
+        self._model_selects: Dict[Tuple[str, str], str] = {}
+        # 表名 -> 表的列名（PRAGMA table_info），用于过滤/校验整表更新和按列查询的列名
+        self._table_columns: Dict[str, frozenset] = {}
+        # 写入只在写连接所在的线程中进行；其他线程经 get_read_conn 从连接池中取独立的只读连接。
+        # 此锁保护连接池的连接计数和代数
+        self._pool_lock = threading.Lock()
+        self._read_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._read_conn_count = 0
+        # 每次 close() 后加一：关闭前借出的只读连接归还时直接关闭，不再放回连接池
+        self._pool_generation = 0
+        # 各线程当前借用的只读连接，同一线程嵌套取连接时复用，不重复占用连接池
+        self._thread_read = threading.local()
+        # 创建写连接的线程
+        self._write_thread: Optional[int] = None
         self.connect()
         
     def connect(self):
         """连接到数据库"""
+        in_memory = self.db_path == ':memory:'
+        
         # 确保目录存在
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        if not in_memory:
+            ensure_dir(os.path.dirname(self.db_path))
         
-        self.connection = sqlite3.connect(self.db_path)
+        # PARSE_COLNAMES只对显式声明 [JSON] 的查询列生效，其余查询仍返回原始文本
+        # 写连接（及其游标）只能在创建它的线程中使用，其他线程读取数据请使用 get_read_conn
+        self.connection = sqlite3.connect(self.db_path, cached_statements=256,
+                                          detect_types=sqlite3.PARSE_COLNAMES)
+        self._write_thread = threading.get_ident()
         self.connection.row_factory = sqlite3.Row  # 返回字典格式的结果
         self.cursor = self.connection.cursor()
+        # 返回元组的游标：批量读取时按列名一次性组装字典，比逐行 dict(sqlite3.Row) 少一次按键取值
+        self._tuple_cursor = self.connection.cursor()
+        self._tuple_cursor.row_factory = None
+        self._tuple_cursor.arraysize = FETCH_BATCH_SIZE
+        
+        # WAL模式：提交只追加日志、无需每次fsync主文件，同步引擎批量写入期间
+        # 其他读连接仍能读到上次提交时的一致快照。数据库旁会生成 -wal/-shm 文件，
+        # 关闭连接时检查点合并；复制数据库请使用 backup_database。内存数据库不使用WAL
+        if self.exclusive and not in_memory:
+            # 须在启用WAL之前设置：独占模式下WAL索引放在进程内存中，不再使用 -shm 文件
+            self.cursor.execute("PRAGMA locking_mode = EXCLUSIVE")
+        if not in_memory:
+            self.cursor.execute("PRAGMA journal_mode = WAL")
+        self.cursor.execute("PRAGMA synchronous = NORMAL")
+        self.cursor.execute("PRAGMA busy_timeout = 5000")  # 其他连接写入时最多等待5秒
+        self.cursor.execute("PRAGMA cache_size = -65536")  # 64MB页缓存
+        self.cursor.execute("PRAGMA temp_store = MEMORY")
+        self.cursor.execute("PRAGMA mmap_size = 268435456")  # 256MB内存映射
+        # 外键约束是连接级设置，每次连接（包括恢复备份后重新连接）都需启用
+        self.cursor.execute("PRAGMA foreign_keys = ON")
+        
+    def _open_read_conn(self) -> sqlite3.Connection:
+        """打开一个只读连接（mode=ro，WAL下读取不阻塞写连接）"""
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, cached_statements=256,
+                               detect_types=sqlite3.PARSE_COLNAMES, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        return conn
+        
+    @contextmanager
+    def get_read_conn(self):
+        """
+        从只读连接池中取一个连接，块结束时归还；连接池已满时等待其他线程归还
+        
+        在写连接所在的线程中：内存数据库无法以只读方式另行打开，独占模式下其他连接无法访问数据库，
+        写连接有未提交的事务时只读连接看不到其中的修改，这些情况下使用写连接本身。
+        其他线程从不使用写连接：事务进行中时读取已提交的快照，内存数据库和独占模式下直接报错。
+        """
+        if threading.get_ident() != self._write_thread:
+            if self._write_conn_only:
+                raise sqlite3.ProgrammingError("内存数据库或独占模式下只能在创建数据库连接的线程中读取")
+        elif self._write_conn_only or self.connection.in_transaction:
+            yield self.connection
+            return
+            
+        with self._pooled_read_conn() as conn:
+            yield conn
+            
+    @property
+    def _write_conn_only(self) -> bool:
+        """是否只能使用写连接（内存数据库或独占模式，不能另开只读连接）"""
+        return self.exclusive or self.db_path == ':memory:'
+        
+    @contextmanager
+    def _pooled_read_conn(self):
+        """
+        从只读连接池中取一个连接（只看到已提交的数据），块结束时归还
         
+        连接池已满时最多等待 READ_POOL_TIMEOUT 秒，超时抛出 sqlite3.OperationalError。
+        同一线程已借用连接时（如迭代 iter_module_data 期间执行其他查询）直接复用该连接。
+        """
+        generation = self._pool_generation
+        held = getattr(self._thread_read, 'held', None)
+        if held is not None and held[1] == generation:
+            yield held[0]
+            return
+            
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._read_conn_count < READ_POOL_SIZE
+                if can_open:
+                    self._read_conn_count += 1
+            if can_open:
+                try:
+                    conn = self._open_read_conn()
+                except Exception:
+                    with self._pool_lock:
+                        self._read_conn_count -= 1
+                    raise
+            else:
+                try:
+                    conn = self._read_pool.get(timeout=READ_POOL_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f"等待只读连接超时（{READ_POOL_TIMEOUT}秒），{READ_POOL_SIZE}个连接均未归还") from None
+        self._thread_read.held = (conn, generation)
+        try:
+            yield conn
+        finally:
+            self._thread_read.held = None
+            if generation == self._pool_generation:
+                self._read_pool.put(conn)
+            else:
+                # 借出期间数据库管理器已关闭
+                conn.close()
+            
     def close(self):
-        """关闭数据库连接"""
+        """关闭数据库连接（仍被借出的只读连接在归还时关闭）"""
+        with self._pool_lock:
+            self._pool_generation += 1
+            self._read_conn_count = 0
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        
         if self.connection:
+            try:
+                # 将WAL中的内容合并回主文件并清空 -wal 文件，关闭后数据库文件可单独复制
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            # 先关闭长期持有的游标：游标上未释放的语句会使连接延迟关闭，独占模式下文件锁随之保留
+            self.cursor.close()
+            self._tuple_cursor.close()
             self.connection.close()
             
-    def initialize_database(self):
-        """初始化数据库表结构"""
+    @contextmanager
+    def transaction(self):
+        """
+        在一个事务中执行多项操作，块结束时统一提交（一次同步落盘），异常时整体回滚
+        
+        块内的 add_*/update_*/delete_* 等单条操作不再自行提交；
+        单条操作失败时只撤销该语句并返回False，是否放弃整个事务由调用方决定。
+        嵌套使用时并入外层事务。写连接不跨线程共享，只能在创建数据库连接的线程中使用。
+        """
+        if threading.get_ident() != self._write_thread:
+            raise sqlite3.ProgrammingError("只能在创建数据库连接的线程中写入数据库")
+        if self._in_txn:
+            yield
+            return
+            
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN IMMEDIATE")
+        self._in_txn = True
         try:
-            # 启用外键约束
-            self.cursor.execute("PRAGMA foreign_keys = ON")
-            
-            # 项目信息表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS project_info (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    version TEXT DEFAULT '1.0.0',
-                    author TEXT,
-                    company TEXT,
-                    created_date TEXT,
-                    modified_date TEXT
-                )
-            ''')
-            
-            # 物料参数表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS material_params (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    material_id TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL,
-                    chemical_formula TEXT,
-                    cas_number TEXT,  -- 新增：CAS号
-                    
-                    -- 物性参数
-                    molar_mass REAL,
-                    density REAL,
-                    viscosity REAL,
-                    specific_heat REAL,
-                    thermal_conductivity REAL,
-                    
-                    -- 质量指标（基于硫酸标准）
-                    sulfuric_acid_content_92 REAL,  -- 92酸含量 %
-                    sulfuric_acid_content_98 REAL,  -- 98酸含量 %
-                    nitrate_content REAL,           -- 硝酸盐含量 %
-                    chloride_content REAL,          -- 氯化物含量 %
-                    iron_content REAL,              -- 铁含量 %
-                    lead_content REAL,              -- 铅含量 mg/kg
-                    arsenic_content REAL,           -- 砷含量 mg/kg
-                    selenium_content REAL,          -- 硒含量 mg/kg
-                    reducing_substances BOOLEAN,    -- 还原性物质检测
-                    
-                    -- 安全信息
-                    safety_class TEXT,
-                    storage_conditions TEXT,
-                    hazard_classification TEXT,     -- 危险分类
-                    
-                    properties_json TEXT,
-                    created_date TEXT,
-                    modified_date TEXT
-                )
-            ''')
-            
-            # MSDS数据表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS msds_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    material_id TEXT NOT NULL,
-                    msds_number TEXT,
-                    hazard_classification TEXT,
-                    precautionary_statements TEXT,
-                    first_aid_measures TEXT,
-                    fire_fighting_measures TEXT,
-                    accidental_release_measures TEXT,
-                    handling_and_storage TEXT,
-                    exposure_controls TEXT,
-                    stability_and_reactivity TEXT,
-                    toxicological_information TEXT,
-                    ecological_information TEXT,
-                    disposal_considerations TEXT,
-                    transport_information TEXT,
-                    regulatory_information TEXT,
-                    other_information TEXT,
-                    FOREIGN KEY (material_id) REFERENCES material_params (material_id) ON DELETE CASCADE
-                )
-            ''')
+            yield
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            self._in_txn = False
             
-            # 过程物料表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS process_materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    stream_id TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL,
-                    phase TEXT,
-                    temperature REAL,
-                    pressure REAL,
-                    flow_rate REAL,
-                    composition_json TEXT,
-                    source_unit TEXT,
-                    destination_unit TEXT,
-                    properties_json TEXT,
-                    created_date TEXT,
-                    modified_date TEXT
-                )
-            ''')
+    def _commit(self):
+        """提交单条操作（处于 transaction() 块中时由块结束时统一提交）"""
+        if not self._in_txn:
+            self.connection.commit()
             
-            # 工艺路线表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS process_flow (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    unit_id TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL,
-                    type TEXT,
-                    description TEXT,
-                    position_x REAL,
-                    position_y REAL,
-                    connections_json TEXT,
-                    parameters_json TEXT,
-                    created_date TEXT,
-                    modified_date TEXT
-                )
-            ''')
+    def _rollback(self):
+        """回滚单条操作（处于 transaction() 块中时不回滚外层事务）"""
+        if not self._in_txn:
+            self.connection.rollback()
             
-            # 设备清单表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS equipment_list (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    equipment_id TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL,
-                    type TEXT,
-                    model TEXT,
-                    specifications_json TEXT,
-                    quantity INTEGER,
-                    material_of_construction TEXT,
-                    operating_conditions_json TEXT,
-                    utility_requirements_json TEXT,
-                    manufacturer TEXT,
-                    created_date TEXT,
-                    modified_date TEXT
+    def initialize_database(self):
+        """初始化数据库表结构"""
+        try:
+            # 全部建表语句一次提交给SQLite解析执行；脚本只开启事务不提交，
+            # 随后的旧数据库迁移与建表在同一事务中，末尾一次提交落盘
+            self.cursor.executescript(f"BEGIN IMMEDIATE;\n{SCHEMA_SQL}")
+            
+            self._normalize_project_info()
+            
+            # 水流股标记（组成中含water或名称含“水”，与DataSyncEngine._is_water_stream一致），
+            # 由触发器维护，旧项目数据库补加该列并回填
+            is_water_expr = '''(
+                json_type(CASE WHEN json_valid({row}.composition_json) THEN {row}.composition_json ELSE '{{}}' END,
+                          '$.water') IS NOT NULL
+                OR instr(coalesce({row}.name, ''), '水') > 0
+            )'''
+            columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(process_materials)")]
+            if 'is_water' not in columns:
+                self.cursor.execute("ALTER TABLE process_materials ADD COLUMN is_water INTEGER DEFAULT 0")
+                self.cursor.execute(
+                    f"UPDATE process_materials SET is_water = {is_water_expr.format(row='process_materials')}"
                 )
-            ''')
-            
-            # 物料平衡表（更新）
             self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS material_balance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    unit_id TEXT NOT NULL,
-                    input_streams_json TEXT,
-                    output_streams_json TEXT,
-                    conversion_rate REAL,
-                    yield REAL,
-                    losses_json TEXT,
-                    calculated_data_json TEXT,
-                    balance_status TEXT DEFAULT 'pending',
-                    tolerance REAL DEFAULT 0.01,
-                    created_date TEXT,
-                    modified_date TEXT,
-                    FOREIGN KEY (unit_id) REFERENCES process_flow (unit_id) ON DELETE CASCADE
-                )
+                CREATE INDEX IF NOT EXISTS idx_pm_water
+                ON process_materials (is_water, source_unit, destination_unit)
             ''')
-            
-            # 热量平衡表（更新）
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS heat_balance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    unit_id TEXT NOT NULL,
-                    input_heat_json TEXT,
-                    output_heat_json TEXT,
-                    heat_loss REAL,
-                    efficiency REAL,
-                    utility_requirements_json TEXT,
-                    calculated_data_json TEXT,
-                    balance_status TEXT DEFAULT 'pending',
-                    created_date TEXT,
-                    modified_date TEXT,
-                    FOREIGN KEY (unit_id) REFERENCES process_flow (unit_id) ON DELETE CASCADE
-                )
+            self.cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_process_materials_water_insert
+                AFTER INSERT ON process_materials
+                BEGIN
+                    UPDATE process_materials SET is_water = {is_water_expr.format(row='NEW')}
+                    WHERE id = NEW.id;
+                END
             ''')
-            
-            # 水平衡表（更新）
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS water_balance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    unit_id TEXT NOT NULL,
-                    fresh_water_in REAL,
-                    recycled_water_in REAL,
-                    water_consumption REAL,
-                    wastewater_out REAL,
-                    reuse_possibilities TEXT,
-                    calculated_data_json TEXT,
-                    created_date TEXT,
-                    modified_date TEXT,
-                    FOREIGN KEY (unit_id) REFERENCES process_flow (unit_id) ON DELETE CASCADE
-                )
+            self.cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_process_materials_water_update
+                AFTER UPDATE OF name, composition_json ON process_materials
+                BEGIN
+                    UPDATE process_materials SET is_water = {is_water_expr.format(row='NEW')}
+                    WHERE id = NEW.id;
+                END
             ''')
             
-            # 数据版本控制表
+            # 为旧项目数据库补建反向索引
             self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS data_versions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    module_name TEXT NOT NULL,
-                    version INTEGER DEFAULT 1,
-                    data_hash TEXT,
-                    change_description TEXT,
-                    changed_by TEXT,
-                    changed_date TEXT
-                )
+                INSERT OR IGNORE INTO stream_composition (stream_id, material_id, fraction)
+                SELECT pm.stream_id, je.key, je.value
+                FROM process_materials pm,
+                     json_each(CASE WHEN json_valid(pm.composition_json) THEN pm.composition_json ELSE '{}' END) je
+                WHERE NOT EXISTS (SELECT 1 FROM stream_composition)
             ''')
             
-            # 数据关系表（用于跟踪数据间的依赖关系）
+            # 旧项目数据库的平衡表没有unit_id唯一约束，补建唯一索引以支持UPSERT
+            self._ensure_unique_unit_id('material_balance')
+            self._ensure_unique_unit_id('heat_balance')
+            self._ensure_unique_unit_id('water_balance')
+            
+            # 旧项目数据库补加data_id列，从 "{data_id}_{32位哈希}" 格式的data_hash中回填
+            columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(data_versions)")]
+            if 'data_id' not in columns:
+                self.cursor.execute("ALTER TABLE data_versions ADD COLUMN data_id TEXT")
+                self.cursor.execute('''
+                    UPDATE data_versions SET data_id = substr(data_hash, 1, length(data_hash) - 33)
+                    WHERE length(data_hash) > 33
+                ''')
             self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS data_relationships (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    source_module TEXT NOT NULL,
-                    source_id TEXT NOT NULL,
-                    target_module TEXT NOT NULL,
-                    target_id TEXT NOT NULL,
-                    relationship_type TEXT,
-                    created_date TEXT
-                )
+                CREATE INDEX IF NOT EXISTS idx_data_versions_module_data
+                ON data_versions (module_name, data_id, version)
             ''')
             
             self.connection.commit()
+            # 需要时更新统计信息，使查询规划器使用上述索引
+            self.cursor.execute("PRAGMA optimize")
             print(f"数据库初始化成功: {self.db_path}")
             return True
             
@@ -265,48 +637,66 @@ class DatabaseManager:
             self.connection.rollback()
             return False
             
+    def _normalize_project_info(self):
+        """
+        将项目信息归一为 id=PROJECT_INFO_ID 的单行
+        
+        旧版本每次保存都先删后插，遗留行的id随自增增长；导入旧版本导出的JSON也会带回原来的id。
+        只保留最近修改的一行（修改时间相同时取id最大的一行）并改写为固定id
+        """
+        self.cursor.execute('''
+            DELETE FROM project_info WHERE id != (
+                SELECT id FROM project_info ORDER BY modified_date DESC, id DESC LIMIT 1
+            )
+        ''')
+        self.cursor.execute("UPDATE project_info SET id = ? WHERE id != ?", (PROJECT_INFO_ID, PROJECT_INFO_ID))
+        
+    def _ensure_unique_unit_id(self, table: str):
+        """确保平衡表的unit_id唯一（重复记录只保留最新一条）"""
+        for index in self.cursor.execute(f"PRAGMA index_list({table})").fetchall():
+            if index['unique']:
+                columns = self.cursor.execute(f"PRAGMA index_info({index['name']})").fetchall()
+                if [column['name'] for column in columns] == ['unit_id']:
+                    return
+                    
+        self.cursor.execute(
+            f"DELETE FROM {table} WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY unit_id)"
+        )
+        self.cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_unit ON {table} (unit_id)"
+        )
+        
     # ========== 项目信息操作 ==========
     
     def save_project_info(self, project_info: ProjectInfo) -> bool:
         """保存项目信息"""
         try:
-            # 首先删除旧的项目信息（只保留一条）
-            self.cursor.execute("DELETE FROM project_info")
-            
-            # 插入新的项目信息（不包含id字段）
-            data = project_info.to_dict()
+            # 项目信息只有一条，固定写入 id=PROJECT_INFO_ID：不存在时插入，已存在时原地更新
+            data = {'id': PROJECT_INFO_ID, **project_info.to_dict()}
             
             # 确保日期字段存在
             if 'created_date' not in data:
                 data['created_date'] = datetime.now().isoformat()
             data['modified_date'] = datetime.now().isoformat()
             
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?' for _ in data])
-            values = list(data.values())
-            
-            query = f"INSERT INTO project_info ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_upsert_sql('project_info', tuple(data), 'id'), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"保存项目信息失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def get_project_info(self) -> Optional[ProjectInfo]:
         """获取项目信息"""
         try:
-            self.cursor.execute("SELECT * FROM project_info LIMIT 1")
-            row = self.cursor.fetchone()
+            # 按模型字段顺序选取（不含id），直接按位置构造
+            query = self._model_select_sql('project_info', ProjectInfo, 'WHERE id = ?')
+            row = self._tuple_cursor.execute(query, (PROJECT_INFO_ID,)).fetchone()
             
             if row:
-                row_dict = dict(row)
-                # 移除id字段，因为ProjectInfo模型不需要
-                if 'id' in row_dict:
-                    del row_dict['id']
-                return ProjectInfo.from_dict(row_dict)
+                return ProjectInfo(*row)
             return None
             
         except Exception as e:
@@ -326,55 +716,31 @@ class DatabaseManager:
             if 'modified_date' not in data:
                 data['modified_date'] = datetime.now().isoformat()
             
-            # 构建SQL语句
-            columns = []
-            placeholders = []
-            values = []
-            
-            for key, value in data.items():
-                columns.append(key)
-                placeholders.append('?')
-                values.append(value)
-            
-            columns_str = ', '.join(columns)
-            placeholders_str = ', '.join(placeholders)
-            
-            query = f"INSERT INTO material_params ({columns_str}) VALUES ({placeholders_str})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_insert_sql('material_params', tuple(data)), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"添加物料参数失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def update_material(self, material: MaterialParameter) -> bool:
         """更新物料参数"""
         try:
             data = material.to_dict()
-            data['modified_date'] = datetime.now().isoformat()
-            
-            # 构建SET子句
-            set_items = []
-            values = []
+            # 修改时间由SQLite在UPDATE中写入
+            data.pop('modified_date', None)
+            data.pop('material_id', None)
             
-            for key, value in data.items():
-                if key != 'material_id':
-                    set_items.append(f"{key}=?")
-                    values.append(value)
-            
-            values.append(material.material_id)  # WHERE子句的参数
-            set_clause = ', '.join(set_items)
-            
-            query = f"UPDATE material_params SET {set_clause} WHERE material_id=?"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            values = (*data.values(), material.material_id)  # 最后一个参数用于WHERE子句
+            self.cursor.execute(_update_sql('material_params', tuple(data), 'material_id', 'modified_date'), values)
+            self._commit()
             return True
             
         except Exception as e:
             print(f"更新物料参数失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def delete_material(self, material_id: str) -> bool:
@@ -382,23 +748,22 @@ class DatabaseManager:
         try:
             query = "DELETE FROM material_params WHERE material_id=?"
             self.cursor.execute(query, (material_id,))
-            self.connection.commit()
+            self._commit()
             return True
             
         except Exception as e:
             print(f"删除物料参数失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def get_material(self, material_id: str) -> Optional[MaterialParameter]:
         """获取单个物料参数"""
         try:
-            query = "SELECT * FROM material_params WHERE material_id=?"
-            self.cursor.execute(query, (material_id,))
-            row = self.cursor.fetchone()
+            query = self._model_select_sql('material_params', MaterialParameter, 'WHERE material_id=?')
+            row = self._tuple_cursor.execute(query, (material_id,)).fetchone()
             
             if row:
-                return MaterialParameter.from_dict(dict(row))
+                return MaterialParameter.from_row(row)
             return None
             
         except Exception as e:
@@ -408,14 +773,8 @@ class DatabaseManager:
     def get_all_materials(self) -> List[MaterialParameter]:
         """获取所有物料参数"""
         try:
-            query = "SELECT * FROM material_params ORDER BY name"
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-            
-            materials = []
-            for row in rows:
-                materials.append(MaterialParameter.from_dict(dict(row)))
-            return materials
+            query = self._model_select_sql('material_params', MaterialParameter, 'ORDER BY name')
+            return [MaterialParameter.from_row(row) for row in self._tuple_cursor.execute(query).fetchall()]
             
         except Exception as e:
             print(f"获取所有物料参数失败: {e}")
@@ -427,29 +786,23 @@ class DatabaseManager:
         """添加MSDS数据"""
         try:
             data = msds.to_dict()
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?' for _ in data])
-            values = list(data.values())
-            
-            query = f"INSERT INTO msds_data ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_insert_sql('msds_data', tuple(data)), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"添加MSDS数据失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def get_msds(self, material_id: str) -> Optional[MSDSData]:
         """获取MSDS数据"""
         try:
-            query = "SELECT * FROM msds_data WHERE material_id=?"
-            self.cursor.execute(query, (material_id,))
-            row = self.cursor.fetchone()
+            query = self._model_select_sql('msds_data', MSDSData, 'WHERE material_id=?')
+            row = self._tuple_cursor.execute(query, (material_id,)).fetchone()
             
             if row:
-                return MSDSData(**dict(row))
+                return MSDSData(*row)
             return None
             
         except Exception as e:
@@ -462,29 +815,23 @@ class DatabaseManager:
         """添加过程物料"""
         try:
             data = material.to_dict()
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?' for _ in data])
-            values = list(data.values())
-            
-            query = f"INSERT INTO process_materials ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_insert_sql('process_materials', tuple(data)), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"添加过程物料失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def get_process_material(self, stream_id: str) -> Optional[ProcessMaterial]:
         """获取单个过程物料"""
         try:
-            query = "SELECT * FROM process_materials WHERE stream_id=?"
-            self.cursor.execute(query, (stream_id,))
-            row = self.cursor.fetchone()
+            query = self._model_select_sql('process_materials', ProcessMaterial, 'WHERE stream_id=?')
+            row = self._tuple_cursor.execute(query, (stream_id,)).fetchone()
             
             if row:
-                return ProcessMaterial.from_dict(dict(row))
+                return ProcessMaterial.from_row(row)
             return None
             
         except Exception as e:
@@ -494,14 +841,8 @@ class DatabaseManager:
     def get_all_process_materials(self) -> List[ProcessMaterial]:
         """获取所有过程物料"""
         try:
-            query = "SELECT * FROM process_materials ORDER BY name"
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-            
-            materials = []
-            for row in rows:
-                materials.append(ProcessMaterial.from_dict(dict(row)))
-            return materials
+            query = self._model_select_sql('process_materials', ProcessMaterial, 'ORDER BY name')
+            return [ProcessMaterial.from_row(row) for row in self._tuple_cursor.execute(query).fetchall()]
             
         except Exception as e:
             print(f"获取所有过程物料失败: {e}")
@@ -513,31 +854,20 @@ class DatabaseManager:
         """添加工艺单元"""
         try:
             data = unit.to_dict()
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?' for _ in data])
-            values = list(data.values())
-            
-            query = f"INSERT INTO process_flow ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_insert_sql('process_flow', tuple(data)), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"添加工艺单元失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def get_all_process_units(self) -> List[ProcessUnit]:
         """获取所有工艺单元"""
         try:
-            query = "SELECT * FROM process_flow ORDER BY name"
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-            
-            units = []
-            for row in rows:
-                units.append(ProcessUnit.from_dict(dict(row)))
-            return units
+            query = self._model_select_sql('process_flow', ProcessUnit, 'ORDER BY name')
+            return [ProcessUnit.from_row(row) for row in self._tuple_cursor.execute(query).fetchall()]
             
         except Exception as e:
             print(f"获取所有工艺单元失败: {e}")
@@ -549,31 +879,20 @@ class DatabaseManager:
         """添加设备"""
         try:
             data = equipment.to_dict()
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?' for _ in data])
-            values = list(data.values())
-            
-            query = f"INSERT INTO equipment_list ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_insert_sql('equipment_list', tuple(data)), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"添加设备失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
     def get_all_equipment(self) -> List[EquipmentItem]:
         """获取所有设备"""
         try:
-            query = "SELECT * FROM equipment_list ORDER BY name"
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-            
-            equipment_list = []
-            for row in rows:
-                equipment_list.append(EquipmentItem.from_dict(dict(row)))
-            return equipment_list
+            query = self._model_select_sql('equipment_list', EquipmentItem, 'ORDER BY name')
+            return [EquipmentItem.from_row(row) for row in self._tuple_cursor.execute(query).fetchall()]
             
         except Exception as e:
             print(f"获取所有设备失败: {e}")
@@ -585,71 +904,309 @@ class DatabaseManager:
         """添加物料平衡"""
         try:
             data = balance.to_dict()
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?' for _ in data])
-            values = list(data.values())
-            
-            query = f"INSERT INTO material_balance ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            self.cursor.execute(_insert_sql('material_balance', tuple(data)), tuple(data.values()))
+            self._commit()
             return True
             
         except Exception as e:
             print(f"添加物料平衡失败: {e}")
-            self.connection.rollback()
+            self._rollback()
             return False
             
+    # ========== 批量添加操作 ==========
+    
+    def _add_many(self, table: str, items: List[Any], label: str) -> bool:
+        """在单个事务中用 executemany 批量插入模型对象"""
+        if not items:
+            return True
+            
+        try:
+            rows = [item.to_dict() for item in items]
+            columns = tuple(rows[0])
+            params = [tuple(row[column] for column in columns) for row in rows]
+            
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self.cursor.executemany(_insert_sql(table, columns), params)
+            self._commit()
+            return True
+            
+        except Exception as e:
+            print(f"批量添加{label}失败: {e}")
+            self._rollback()
+            return False
+            
+    def add_materials_many(self, materials: List[MaterialParameter]) -> bool:
+        """批量添加物料参数"""
+        return self._add_many('material_params', materials, '物料参数')
+        
+    def add_msds_many(self, msds_list: List[MSDSData]) -> bool:
+        """批量添加MSDS数据"""
+        return self._add_many('msds_data', msds_list, 'MSDS数据')
+        
+    def add_process_materials_many(self, materials: List[ProcessMaterial]) -> bool:
+        """批量添加过程物料"""
+        return self._add_many('process_materials', materials, '过程物料')
+        
+    def add_process_units_many(self, units: List[ProcessUnit]) -> bool:
+        """批量添加工艺单元"""
+        return self._add_many('process_flow', units, '工艺单元')
+        
+    def add_equipment_many(self, equipment_list: List[EquipmentItem]) -> bool:
+        """批量添加设备"""
+        return self._add_many('equipment_list', equipment_list, '设备')
+        
+    def add_material_balances_many(self, balances: List[MaterialBalance]) -> bool:
+        """批量添加物料平衡"""
+        return self._add_many('material_balance', balances, '物料平衡')
+        
+    def bulk_save(self, materials: Optional[List[MaterialParameter]] = None,
+                  msds: Optional[List[MSDSData]] = None,
+                  process_materials: Optional[List[ProcessMaterial]] = None,
+                  units: Optional[List[ProcessUnit]] = None,
+                  equipment: Optional[List[EquipmentItem]] = None,
+                  balances: Optional[List[MaterialBalance]] = None) -> bool:
+        """在同一个事务中批量添加多个模块的数据，任一部分失败则全部回滚"""
+        try:
+            with self.transaction():
+                # 父表在前：msds_data引用material_params，物料平衡引用process_flow
+                for table, items, label in (
+                    ('material_params', materials, '物料参数'),
+                    ('msds_data', msds, 'MSDS数据'),
+                    ('process_materials', process_materials, '过程物料'),
+                    ('process_flow', units, '工艺单元'),
+                    ('equipment_list', equipment, '设备'),
+                    ('material_balance', balances, '物料平衡'),
+                ):
+                    if items and not self._add_many(table, items, label):
+                        raise sqlite3.DatabaseError(f"{label}写入失败")
+            return True
+            
+        except Exception as e:
+            print(f"批量保存失败: {e}")
+            return False
+        
     # ========== 通用查询方法 ==========
     
     def get_module_data(self, module_name: str) -> Dict[str, Any]:
         """获取指定模块的所有数据"""
-        table_map = {
-            "material_params": ("material_params", MaterialParameter),
-            "msds_data": ("msds_data", MSDSData),
-            "process_materials": ("process_materials", ProcessMaterial),
-            "process_flow": ("process_flow", ProcessUnit),
-            "equipment_list": ("equipment_list", EquipmentItem),
-            "material_balance": ("material_balance", MaterialBalance),
-        }
-        
-        if module_name not in table_map:
+        if module_name not in self._MODULE_SELECT:
             return {"data": [], "count": 0}
             
-        table_name, model_class = table_map[module_name]
-        
         try:
-            query = f"SELECT * FROM {table_name}"
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-            
-            data = []
-            for row in rows:
-                if hasattr(model_class, 'from_dict'):
-                    data.append(model_class.from_dict(dict(row)))
-                else:
-                    data.append(dict(row))
-                    
+            data = list(self.iter_module_data(module_name))
             return {"data": data, "count": len(data)}
             
         except Exception as e:
             print(f"获取模块数据失败 {module_name}: {e}")
             return {"data": [], "count": 0}
             
+    def update_module_data(self, module_name: str, data: Dict[str, Any]) -> bool:
+        """
+        按唯一键整批写回指定模块的数据（已存在则更新，不存在则插入）
+        
+        data 与 get_module_data 的返回格式相同，data["data"] 中可以是模型对象或行字典。
+        所有行共用一条UPSERT语句，在同一个事务中用 executemany 写入；
+        不使用 INSERT OR REPLACE，以免先删除旧行触发外键级联删除并改变自增id。
+        """
+        key_column = self._MODULE_KEYS.get(module_name)
+        if key_column is None:
+            print(f"更新模块数据失败 {module_name}: 不支持按唯一键更新")
+            return False
+            
+        items = data.get("data") or []
+        if not items:
+            return True
+            
+        try:
+            rows = [item if isinstance(item, dict) else item.to_dict() for item in items]
+            table_columns = self._columns_of(module_name)
+            # 自增id由SQLite维护，不参与写入
+            columns = tuple(column for column in rows[0] if column in table_columns and column != 'id')
+            params = [tuple(row.get(column) for column in columns) for row in rows]
+            
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self.cursor.executemany(_upsert_sql(module_name, columns, key_column), params)
+            self._commit()
+            return True
+            
+        except Exception as e:
+            print(f"更新模块数据失败 {module_name}: {e}")
+            self._rollback()
+            return False
+            
+    def _columns_of(self, table: str) -> frozenset:
+        """表的列名集合（按表名缓存）；表名作为参数绑定查询，不存在的表返回空集合"""
+        table_columns = self._table_columns.get(table)
+        if table_columns is None:
+            with self.get_read_conn() as conn:
+                table_columns = frozenset(row[0] for row in
+                                          conn.execute("SELECT name FROM pragma_table_info(?)", (table,)))
+            if table_columns:
+                self._table_columns[table] = table_columns
+        return table_columns
+        
+    def get_columns(self, table: str, columns: List[str], where: Optional[str] = None,
+                    params: tuple = ()) -> List[Tuple]:
+        """
+        只查询指定表的指定列，以行元组列表返回（按 columns 的顺序按下标取值，不构造字典）
+        
+        表名和列名必须是数据库中实际存在的表/列；where 为可选的WHERE条件，
+        其中的值一律使用 ? 占位并通过 params 绑定。
+        """
+        table_columns = self._columns_of(table)
+        unknown = [column for column in columns if column not in table_columns]
+        if not columns or unknown:
+            print(f"查询列失败 {table}: 无效的表或列 {unknown or columns}")
+            return []
+            
+        sql = f"SELECT {', '.join(columns)} FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+            
+        try:
+            with self.get_read_conn() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                try:
+                    return cursor.execute(sql, params).fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"查询列失败 {table}: {e}")
+            return []
+            
+    def iter_module_data(self, module_name: str) -> Iterator[Any]:
+        """
+        逐行迭代指定模块的数据，不一次性载入整张表
+        
+        有模型的模块按行元组直接构造模型（from_row），其余模块返回行字典；
+        使用连接池中的只读连接（迭代结束后归还），迭代期间可以继续执行其他查询。
+        未知模块不产生任何数据。
+        """
+        if module_name not in self._MODULE_SELECT:
+            return
+        select_sql, _, model_class = self._MODULE_SELECT[module_name]
+        if model_class:
+            # 在取只读连接之前生成语句：首次生成时查询表的列名也要占用一个只读连接
+            select_sql = self._model_select_sql(module_name, model_class)
+        
+        with self.get_read_conn() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.arraysize = FETCH_BATCH_SIZE
+            try:
+                # 按批取行，每批在C层循环中构造，内存占用只与批大小有关
+                cursor.execute(select_sql)
+                if model_class:
+                    while batch := cursor.fetchmany():
+                        yield from map(model_class.from_row, batch)
+                else:
+                    columns = [description[0] for description in cursor.description]
+                    while batch := cursor.fetchmany():
+                        yield from (dict(zip(columns, row)) for row in batch)
+            finally:
+                cursor.close()
+            
+    def count_module_data(self, module_name: str) -> int:
+        """统计指定模块的记录数（COUNT(*)，不读取行数据）"""
+        if module_name not in self._MODULE_SELECT:
+            return 0
+            
+        try:
+            with self.get_read_conn() as conn:
+                return conn.execute(self._MODULE_SELECT[module_name][1]).fetchone()[0]
+        except Exception as e:
+            print(f"统计模块数据失败 {module_name}: {e}")
+            return 0
+            
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        """执行自定义查询"""
+        """执行自定义查询（只接受 SELECT/WITH 只读查询，参数一律通过params绑定）"""
+        if not _is_read_query(query):
+            print(f"执行查询失败: 只允许SELECT/WITH查询: {query.strip()[:50]}")
+            return []
+            
         try:
-            self.cursor.execute(query, params)
-            rows = self.cursor.fetchall()
-            return [dict(row) for row in rows]
+            return self._query_dicts(query, params)
         except Exception as e:
             print(f"执行查询失败: {e}")
             return []
             
+    def iter_query(self, query: str, params: tuple = ()) -> Iterator[tuple]:
+        """
+        逐行迭代只读查询的结果（元组），不一次性载入全部结果
+        
+        使用独立游标，迭代期间可以继续执行其他查询。
+        非 SELECT/WITH 查询抛出 ValueError。
+        """
+        if not _is_read_query(query):
+            raise ValueError(f"只允许SELECT/WITH查询: {query.strip()[:50]}")
+            
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        cursor.arraysize = FETCH_BATCH_SIZE
+        try:
+            cursor.execute(query, params)
+            while batch := cursor.fetchmany():
+                yield from batch
+        finally:
+            cursor.close()
+            
+    def _model_select_sql(self, table: str, model_class: type, clause: str = '') -> str:
+        """
+        生成供模型 from_row 使用的查询语句：按模型字段的声明顺序逐列选取
+        
+        xxx_json列以字段xxx返回并由sqlite3直接解码，空值按字段默认值（{}或[]）返回；
+        bool字段同样由sqlite3转换。多余的列（如id）不选取。
+        clause为附加在FROM之后的WHERE/ORDER BY/LIMIT子句。
+        """
+        key = (table, clause)
+        sql = self._model_selects.get(key)
+        if sql is None:
+            # 表的列名经只读连接查询（_columns_of），其他线程生成查询语句时不使用写连接
+            table_columns = self._columns_of(table)
+            columns = []
+            for model_field in fields(model_class):
+                name = model_field.name
+                if f"{name}_json" in table_columns:
+                    default = fast_json.dumps(model_field.default_factory())
+                    columns.append(f"COALESCE(NULLIF({name}_json, ''), '{default}') AS \"{name} [JSON]\"")
+                elif model_field.type is bool:
+                    columns.append(f"{name} AS \"{name} [BOOL]\"")
+                else:
+                    columns.append(name)
+            sql = f"SELECT {', '.join(columns)} FROM {table}"
+            if clause:
+                sql += f" {clause}"
+            self._model_selects[key] = sql
+        return sql
+        
+    def _query_dicts(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """执行查询，以字典列表返回结果（列名只读取一次）"""
+        cursor = self._tuple_cursor
+        cursor.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            
     def backup_database(self, backup_path: str) -> bool:
         """备份数据库"""
         try:
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
+            # WAL模式下最近的提交可能还在-wal文件中，使用SQLite在线备份而不是复制数据库文件；
+            # 分步复制，每步之间释放读锁，大数据库备份期间不会长时间阻塞其他连接。
+            # 从只读连接复制已提交的快照，备份期间写连接可以继续写入
+            backup = sqlite3.connect(backup_path)
+            try:
+                if self._write_conn_only:
+                    # 写连接有未提交的写入时在线备份会一直返回 SQLITE_LOCKED
+                    if self.connection.in_transaction:
+                        raise sqlite3.OperationalError("事务进行中，无法备份")
+                    self.connection.backup(backup, pages=BACKUP_PAGES_PER_STEP)
+                else:
+                    with self._pooled_read_conn() as conn:
+                        conn.backup(backup, pages=BACKUP_PAGES_PER_STEP)
+            finally:
+                backup.close()
             print(f"数据库备份成功: {backup_path}")
             return True
         except Exception as e:
@@ -659,30 +1216,90 @@ class DatabaseManager:
     def restore_database(self, backup_path: str) -> bool:
         """恢复数据库"""
         try:
-            import shutil
-            shutil.copy2(backup_path, self.db_path)
+            # 通过在线备份写回当前连接，避免覆盖文件后与-wal文件不一致
+            source = sqlite3.connect(backup_path)
+            try:
+                source.backup(self.connection)
+            finally:
+                source.close()
+            if not self._migrate_restored():
+                return False
             print(f"数据库恢复成功: {self.db_path}")
             return True
         except Exception as e:
             print(f"数据库恢复失败: {e}")
             return False
             
+    def _migrate_restored(self) -> bool:
+        """
+        恢复后重新执行建表和旧数据库迁移，并清空缓存的表结构信息
+        
+        备份可能来自旧版本（缺少 is_water 列、stream_composition 表、平衡表的unit_id唯一索引等），
+        按列名生成的查询语句和列名集合也可能与恢复后的表结构不一致
+        """
+        self._table_columns.clear()
+        self._model_selects.clear()
+        return self.initialize_database()
+        
+    def backup_to_sql(self, sql_path: str) -> bool:
+        """将数据库导出为SQL脚本（sqlite3.iterdump逐条生成，不经过JSON编码）"""
+        try:
+            with open(sql_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"{line}\n" for line in self.connection.iterdump())
+            print(f"数据库导出SQL成功: {sql_path}")
+            return True
+        except Exception as e:
+            print(f"数据库导出SQL失败: {e}")
+            return False
+            
+    def restore_from_sql(self, sql_path: str) -> bool:
+        """从 backup_to_sql 生成的SQL脚本恢复数据库"""
+        try:
+            with open(sql_path, 'r', encoding='utf-8') as f:
+                script = f.read()
+            # 脚本包含建表语句，先在内存数据库中执行，再通过在线备份整体写回当前连接
+            source = sqlite3.connect(':memory:')
+            try:
+                source.executescript(script)
+                source.backup(self.connection)
+            finally:
+                source.close()
+            if not self._migrate_restored():
+                return False
+            print(f"数据库从SQL恢复成功: {self.db_path}")
+            return True
+        except Exception as e:
+            print(f"数据库从SQL恢复失败: {e}")
+            return False
+            
     def export_to_json(self, export_path: str) -> bool:
         """导出数据库到JSON文件"""
         try:
-            data = {}
-            
             # 获取所有表名
             self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = [row['name'] for row in self.cursor.fetchall()]
             
-            for table in tables:
-                self.cursor.execute(f"SELECT * FROM {table}")
-                rows = self.cursor.fetchall()
-                data[table] = [dict(row) for row in rows]
-                
+            # 逐表按批写入文件，不在内存中构建整个数据库的字典；
+            # 输出格式与 json.dump(data, indent=2) 相同
+            cursor = self._tuple_cursor
             with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.write('{')
+                for table_index, table in enumerate(tables):
+                    f.write('\n  ' if table_index == 0 else ',\n  ')
+                    f.write(f"{json.dumps(table, ensure_ascii=False)}: [")
+                    
+                    cursor.execute(f"SELECT * FROM {table}")
+                    columns = [description[0] for description in cursor.description]
+                    empty = True
+                    while batch := cursor.fetchmany():
+                        f.write('\n    ' if empty else ',\n    ')
+                        f.write(',\n    '.join(
+                            json.dumps(dict(zip(columns, row)), indent=2, ensure_ascii=False).replace('\n', '\n    ')
+                            for row in batch
+                        ))
+                        empty = False
+                    f.write(']' if empty else '\n  ]')
+                f.write('\n}' if tables else '}')
                 
             print(f"数据库导出成功: {export_path}")
             return True
@@ -694,25 +1311,35 @@ class DatabaseManager:
     def import_from_json(self, import_path: str) -> bool:
         """从JSON文件导入数据库"""
         try:
-            with open(import_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(import_path, 'rb') as f:
+                data = fast_json.loads(f.read())
                 
-            for table, rows in data.items():
+            # 所有表在同一个事务中导入，外键检查推迟到提交时统一进行，插入时不再逐行校验
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self.cursor.execute("PRAGMA defer_foreign_keys = ON")
+            
+            # 父表先导入：清空父表时ON DELETE CASCADE仍会立即级联删除子表行，
+            # 父表在后会把刚导入的子表数据一并删掉；其余表保持文件中的顺序
+            tables = sorted(data.items(), key=lambda item: item[0] not in IMPORT_PARENT_TABLES)
+            
+            for table, rows in tables:
                 if rows:
                     # 获取列名
-                    columns = list(rows[0].keys())
-                    columns_str = ', '.join(columns)
-                    placeholders = ', '.join(['?' for _ in columns])
+                    columns = tuple(rows[0].keys())
                     
                     # 清空表
                     self.cursor.execute(f"DELETE FROM {table}")
                     
-                    # 插入数据
-                    for row in rows:
-                        values = [row[col] for col in columns]
-                        query = f"INSERT INTO {table} ({columns_str}) VALUES ({placeholders})"
-                        self.cursor.execute(query, values)
+                    # 批量插入数据
+                    self.cursor.executemany(
+                        _insert_sql(table, columns),
+                        [tuple(row[col] for col in columns) for row in rows]
+                    )
                         
+            # 旧版本导出的项目信息带有原来的自增id
+            if data.get('project_info'):
+                self._normalize_project_info()
             self.connection.commit()
             print(f"数据库导入成功: {import_path}")
             return True
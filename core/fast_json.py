@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON编解码
+
+安装了orjson时使用orjson（输出紧凑格式、不转义非ASCII字符，解析结果与
+json.dumps(..., ensure_ascii=False) 相同），否则退回标准库json。
+"""
+
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+
+    _DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj, sort_keys: bool = False) -> str:
+        """序列化为JSON字符串（不转义非ASCII字符）"""
+        option = _DUMPS_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _DUMPS_OPTIONS
+        return orjson.dumps(obj, option=option).decode('utf-8')
+
+    def dumps_bytes(obj, sort_keys: bool = False, default=None, indent: bool = False) -> bytes:
+        """
+        序列化为UTF-8编码的JSON字节串（用于哈希、以二进制方式写文件等不需要str的场合）
+        
+        default处理无法序列化的对象；indent=True时按2空格缩进（与 json.dumps(indent=2) 格式相同）
+        """
+        option = _DUMPS_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _DUMPS_OPTIONS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+
+    def loads(s):
+        """解析JSON字符串；orjson不接受的内容（如旧版标准库写入的NaN）交给标准库json解析"""
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return json.loads(s)
+
+else:
+
+    def dumps(obj, sort_keys: bool = False) -> str:
+        """序列化为JSON字符串（不转义非ASCII字符）"""
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys)
+
+    def dumps_bytes(obj, sort_keys: bool = False, default=None, indent: bool = False) -> bytes:
+        """
+        序列化为UTF-8编码的JSON字节串（用于哈希、以二进制方式写文件等不需要str的场合）
+        
+        default处理无法序列化的对象；indent=True时按2空格缩进
+        """
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, default=default,
+                          indent=2 if indent else None).encode('utf-8')
+
+    loads = json.loads
@@ -1,11 +1,68 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from dataclasses import dataclass, field, asdict, fields
+import time
+from dataclasses import dataclass, field, fields
 from typing import Dict, List, Any, Optional, Union, Tuple
 from datetime import datetime
-import json
+from functools import lru_cache
+import numpy as np
 
-@dataclass
+from . import fast_json
+
+
+# 当前时间ISO字符串的缓存 [时间戳, 字符串]：同一毫秒内创建的实例共用一个字符串
+_now_cache = [0.0, ""]
+
+
+def _now_iso() -> str:
+    """当前本地时间的ISO格式字符串（created_date/modified_date的默认值，按毫秒缓存）"""
+    now = time.time()
+    # 系统时钟回拨时同样重新格式化
+    if not 0.0 <= now - _now_cache[0] < 0.001:
+        _now_cache[0] = now
+        _now_cache[1] = datetime.fromtimestamp(now).isoformat()
+    return _now_cache[1]
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls) -> Tuple[str, ...]:
+    """数据类的字段名（按定义顺序，每个类只计算一次）"""
+    return tuple(f.name for f in fields(cls))
+
+
+def _fields_dict(obj) -> Dict[str, Any]:
+    """
+    数据类实例的字段字典（浅拷贝）
+    
+    字典/列表字段随后直接序列化为JSON列，不需要 asdict 的递归深拷贝
+    """
+    return {name: getattr(obj, name) for name in _field_names(type(obj))}
+
+
+@lru_cache(maxsize=None)
+def _json_fields(cls) -> Tuple[Tuple[str, str, Any], ...]:
+    """以 xxx_json 列存储的字典/列表字段：(字段名, 列名, 默认值工厂)，每个类只计算一次"""
+    return tuple((f.name, f"{f.name}_json", f.default_factory)
+                 for f in fields(cls) if f.default_factory in (dict, list))
+
+
+def _row_kwargs(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+    """由数据库行字典生成构造参数：只解析该类的JSON列，并去掉id等不属于模型的列"""
+    for name, column, default_factory in _json_fields(cls):
+        if column in data:
+            value = data[column]
+            data[name] = fast_json.loads(value) if value else default_factory()
+    return {name: data[name] for name in _field_names(cls) if name in data}
+
+
+def _row_dict(obj) -> Dict[str, Any]:
+    """模型实例转换为数据库行字典：字典/列表字段序列化为 xxx_json 列（_row_kwargs 的逆操作）"""
+    data = _fields_dict(obj)
+    for name, column, _ in _json_fields(type(obj)):
+        data[column] = fast_json.dumps(data.pop(name))
+    return data
+
+@dataclass(slots=True)
 class MaterialParameter:
     """物料参数模型 - 基于硫酸标准扩展"""
     material_id: str
@@ -38,14 +95,14 @@ class MaterialParameter:
     
     # 其他属性
     properties: Dict[str, Any] = field(default_factory=dict)
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     # 计算属性
     @property
     def molecular_weight(self) -> Optional[float]:
-        """获取分子量（kg/kmol）"""
-        return self.molar_mass if self.molar_mass is None else self.molar_mass
+        """获取分子量（kg/kmol），即 molar_mass"""
+        return self.molar_mass
     
     @property
     def heat_capacity(self) -> Optional[float]:
@@ -62,26 +119,14 @@ class MaterialParameter:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
-        
-        # 处理properties字段为JSON字符串
-        if 'properties' in data:
-            data['properties_json'] = json.dumps(data.pop('properties', {}), ensure_ascii=False)
-        
-        # 处理其他需要JSON序列化的字段
+        data = _row_dict(self)
         data['reducing_substances'] = 1 if self.reducing_substances else 0
         
         return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'MaterialParameter':
-        """从字典创建实例"""
-        # 处理properties_json字段
-        if 'properties_json' in data:
-            properties_json = data.pop('properties_json', None)
-            if properties_json:
-                data['properties'] = json.loads(properties_json) if properties_json else {}
-        
+        """从字典创建实例（解析JSON列，过滤掉数据库中的额外字段如id）"""
         # 处理reducing_substances（SQLite可能存储为整数）
         if 'reducing_substances' in data:
             reducing = data['reducing_substances']
@@ -90,13 +135,14 @@ class MaterialParameter:
             elif isinstance(reducing, str):
                 data['reducing_substances'] = reducing.lower() in ['true', '1', 'yes']
         
-        # 过滤掉数据库中可能存在的额外字段（如id）
-        valid_fields = [field.name for field in fields(cls)]
-        filtered_data = {k: v for k, v in data.items() if k in valid_fields}
+        return cls(**_row_kwargs(cls, data))
         
-        return cls(**filtered_data)
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'MaterialParameter':
+        """从按字段声明顺序查询的行元组创建实例（JSON列和布尔列已由数据库连接解码）"""
+        return cls(*row)
 
-@dataclass
+@dataclass(slots=True)
 class MSDSData:
     """MSDS数据模型"""
     material_id: str
@@ -118,9 +164,9 @@ class MSDSData:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        return asdict(self)
+        return _fields_dict(self)
 
-@dataclass
+@dataclass(slots=True)
 class ProcessMaterial:
     """过程物料模型 - 添加计算属性"""
     stream_id: str
@@ -133,8 +179,8 @@ class ProcessMaterial:
     source_unit: Optional[str] = None
     destination_unit: Optional[str] = None
     properties: Dict[str, Any] = field(default_factory=dict)
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     # 计算属性
     @property
@@ -159,8 +205,22 @@ class ProcessMaterial:
         if self.flow_rate and material_id in self.composition:
             return self.flow_rate * self.composition[material_id]
         return None
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return _row_dict(self)
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProcessMaterial':
+        """从字典创建实例（解析JSON列，过滤掉数据库中的额外字段如id）"""
+        return cls(**_row_kwargs(cls, data))
+        
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'ProcessMaterial':
+        """从按字段声明顺序查询的行元组创建实例（JSON列已由数据库连接解码）"""
+        return cls(*row)
 
-@dataclass
+@dataclass(slots=True)
 class ProcessUnit:
     """工艺单元模型"""
     unit_id: str
@@ -171,26 +231,24 @@ class ProcessUnit:
     position_y: float = 0.0
     connections: List[Dict[str, Any]] = field(default_factory=list)
     parameters: Dict[str, Any] = field(default_factory=dict)
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
-        data['connections_json'] = json.dumps(data.pop('connections', []), ensure_ascii=False)
-        data['parameters_json'] = json.dumps(data.pop('parameters', {}), ensure_ascii=False)
-        return data
+        return _row_dict(self)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ProcessUnit':
-        """从字典创建实例"""
-        if 'connections_json' in data:
-            data['connections'] = json.loads(data['connections_json']) if data['connections_json'] else []
-        if 'parameters_json' in data:
-            data['parameters'] = json.loads(data['parameters_json']) if data['parameters_json'] else {}
-        return cls(**{k: v for k, v in data.items() if not k.endswith('_json')})
+        """从字典创建实例（解析JSON列，过滤掉数据库中的额外字段如id）"""
+        return cls(**_row_kwargs(cls, data))
+        
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'ProcessUnit':
+        """从按字段声明顺序查询的行元组创建实例（JSON列已由数据库连接解码）"""
+        return cls(*row)
 
-@dataclass
+@dataclass(slots=True)
 class EquipmentItem:
     """设备清单模型"""
     equipment_id: str
@@ -203,29 +261,24 @@ class EquipmentItem:
     operating_conditions: Dict[str, Any] = field(default_factory=dict)
     utility_requirements: Dict[str, Any] = field(default_factory=dict)
     manufacturer: Optional[str] = None
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
-        data['specifications_json'] = json.dumps(data.pop('specifications', {}), ensure_ascii=False)
-        data['operating_conditions_json'] = json.dumps(data.pop('operating_conditions', {}), ensure_ascii=False)
-        data['utility_requirements_json'] = json.dumps(data.pop('utility_requirements', {}), ensure_ascii=False)
-        return data
+        return _row_dict(self)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'EquipmentItem':
-        """从字典创建实例"""
-        if 'specifications_json' in data:
-            data['specifications'] = json.loads(data['specifications_json']) if data['specifications_json'] else {}
-        if 'operating_conditions_json' in data:
-            data['operating_conditions'] = json.loads(data['operating_conditions_json']) if data['operating_conditions_json'] else {}
-        if 'utility_requirements_json' in data:
-            data['utility_requirements'] = json.loads(data['utility_requirements_json']) if data['utility_requirements_json'] else {}
-        return cls(**{k: v for k, v in data.items() if not k.endswith('_json')})
+        """从字典创建实例（解析JSON列，过滤掉数据库中的额外字段如id）"""
+        return cls(**_row_kwargs(cls, data))
+        
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'EquipmentItem':
+        """从按字段声明顺序查询的行元组创建实例（JSON列已由数据库连接解码）"""
+        return cls(*row)
 
-@dataclass
+@dataclass(slots=True)
 class MaterialBalance:
     """物料平衡模型 - 增强"""
     unit_id: str
@@ -237,46 +290,48 @@ class MaterialBalance:
     balance_status: str = "pending"  # pending, calculated, balanced, unbalanced
     calculated_data: Dict[str, Any] = field(default_factory=dict)  # 计算结果
     tolerance: float = 0.01  # 允许的平衡误差 (%)
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     def calculate_balance(self, input_streams_data: List[ProcessMaterial], 
                          output_streams_data: List[ProcessMaterial]) -> Dict[str, Any]:
-        """计算物料平衡"""
+        """计算物料平衡（组装为流股×组分的质量分数矩阵后按 calculate_from_arrays 计算）"""
+        streams = input_streams_data + output_streams_data
+        # 组分按首次出现的顺序编号
+        component_index: Dict[str, int] = {}
+        for stream in streams:
+            for component in stream.composition:
+                component_index.setdefault(component, len(component_index))
+                
+        # 每个流股只遍历自身含有的组分，按列号一次写入矩阵的一行（不逐个查询全部组分）
+        flow_rates = np.array([stream.flow_rate or 0.0 for stream in streams], dtype=np.float64)
+        comp_matrix = np.zeros((len(streams), len(component_index)))
+        for row, stream in enumerate(streams):
+            if stream.composition:
+                columns = [component_index[component] for component in stream.composition]
+                comp_matrix[row, columns] = list(stream.composition.values())
+                
+        is_input = np.arange(len(streams)) < len(input_streams_data)
+        
+        return self.calculate_from_arrays(flow_rates, is_input, ~is_input, list(component_index), comp_matrix)
+        
+    def calculate_from_arrays(self, flow_rates: np.ndarray, is_input: np.ndarray, is_output: np.ndarray,
+                              components: List[str], comp_matrix: np.ndarray) -> Dict[str, Any]:
+        """按列式数组计算物料平衡（结果格式与 calculate_balance 相同）"""
+        input_flows = np.where(is_input, flow_rates, 0.0)
+        output_flows = np.where(is_output, flow_rates, 0.0)
+        comp_inputs = input_flows @ comp_matrix
+        comp_outputs = output_flows @ comp_matrix
+        
         results = {
-            "total_input": 0.0,
-            "total_output": 0.0,
+            "total_input": float(input_flows.sum()),
+            "total_output": float(output_flows.sum()),
             "components": {},
             "is_balanced": False,
             "differences": {}
         }
         
-        # 计算总输入输出
-        for stream in input_streams_data:
-            if stream.flow_rate:
-                results["total_input"] += stream.flow_rate
-                
-        for stream in output_streams_data:
-            if stream.flow_rate:
-                results["total_output"] += stream.flow_rate
-                
-        # 计算组分平衡
-        all_components = set()
-        for stream in input_streams_data + output_streams_data:
-            all_components.update(stream.composition.keys())
-            
-        for component in all_components:
-            comp_input = 0.0
-            comp_output = 0.0
-            
-            for stream in input_streams_data:
-                if stream.flow_rate and component in stream.composition:
-                    comp_input += stream.flow_rate * stream.composition[component]
-                    
-            for stream in output_streams_data:
-                if stream.flow_rate and component in stream.composition:
-                    comp_output += stream.flow_rate * stream.composition[component]
-                    
+        for component, comp_input, comp_output in zip(components, comp_inputs.tolist(), comp_outputs.tolist()):
             results["components"][component] = {
                 "input": comp_input,
                 "output": comp_output,
@@ -284,6 +339,10 @@ class MaterialBalance:
                 "conversion": ((comp_input - comp_output) / comp_input * 100) if comp_input > 0 else 0
             }
             
+        return self._finish_balance(results)
+        
+    def _finish_balance(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        """根据总输入输出判断平衡状态"""
         # 检查平衡状态
         total_diff = results["total_output"] - results["total_input"]
         diff_percent = (abs(total_diff) / results["total_input"] * 100) if results["total_input"] > 0 else 100
@@ -299,8 +358,14 @@ class MaterialBalance:
             
         self.calculated_data = results
         return results
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（键与 material_balance 表的列一致）"""
+        data = _row_dict(self)
+        data['yield'] = data.pop('yield_value')
+        return data
 
-@dataclass
+@dataclass(slots=True)
 class ProjectInfo:
     """项目信息模型"""
     name: str
@@ -308,8 +373,8 @@ class ProjectInfo:
     version: str = "1.0.0"
     author: Optional[str] = None
     company: Optional[str] = None
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典（不包含id字段）"""
@@ -327,11 +392,9 @@ class ProjectInfo:
     def from_dict(cls, data: Dict[str, Any]) -> 'ProjectInfo':
         """从字典创建实例，过滤掉不必要的字段"""
         # 过滤掉数据库中的id字段和其他不需要的字段
-        valid_fields = [field.name for field in fields(cls)]
-        filtered_data = {k: v for k, v in data.items() if k in valid_fields}
-        return cls(**filtered_data)
+        return cls(**{name: data[name] for name in _field_names(cls) if name in data})
     
-@dataclass
+@dataclass(slots=True)
 class HeatBalance:
     """热量平衡模型"""
     unit_id: str
@@ -342,27 +405,14 @@ class HeatBalance:
     utility_requirements: Dict[str, float] = field(default_factory=dict)  # 公用工程需求
     calculated_data: Dict[str, Any] = field(default_factory=dict)  # 计算结果
     balance_status: str = "pending"
-    created_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    modified_date: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_date: str = field(default_factory=_now_iso)
+    modified_date: str = field(default_factory=_now_iso)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
-        data['input_heat_json'] = json.dumps(data.pop('input_heat', {}), ensure_ascii=False)
-        data['output_heat_json'] = json.dumps(data.pop('output_heat', {}), ensure_ascii=False)
-        data['utility_requirements_json'] = json.dumps(data.pop('utility_requirements', {}), ensure_ascii=False)
-        data['calculated_data_json'] = json.dumps(data.pop('calculated_data', {}), ensure_ascii=False)
-        return data
+        return _row_dict(self)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'HeatBalance':
-        """从字典创建实例"""
-        if 'input_heat_json' in data:
-            data['input_heat'] = json.loads(data['input_heat_json']) if data['input_heat_json'] else {}
-        if 'output_heat_json' in data:
-            data['output_heat'] = json.loads(data['output_heat_json']) if data['output_heat_json'] else {}
-        if 'utility_requirements_json' in data:
-            data['utility_requirements'] = json.loads(data['utility_requirements_json']) if data['utility_requirements_json'] else {}
-        if 'calculated_data_json' in data:
-            data['calculated_data'] = json.loads(data['calculated_data_json']) if data['calculated_data_json'] else {}
-        return cls(**{k: v for k, v in data.items() if not k.endswith('_json')})
\ No newline at end of file
+        """从字典创建实例（解析JSON列，过滤掉数据库中的额外字段如id）"""
+        return cls(**_row_kwargs(cls, data))
\ No newline at end of file
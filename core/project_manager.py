@@ -1,18 +1,35 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import os
-import json
 import shutil
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
-from PySide6.QtCore import QObject, Signal, QTimer
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, QTimer
 
-from config import DB_CONFIG, APP_CONFIG
+from config import DB_CONFIG, APP_CONFIG, create_directories, ensure_dir, forget_dirs
+from . import fast_json
 from .database import DatabaseManager
 from .data_sync import DataSyncEngine
 from .models import ProjectInfo
 
+class _DeleteProjectTask(QRunnable):
+    """在线程池中删除项目目录，完成后发出 ProjectManager.project_deleted（跨线程信号排队送达接收者所在线程）"""
+    
+    def __init__(self, manager: 'ProjectManager', project_path: str):
+        super().__init__()
+        self._manager = manager
+        self._project_path = project_path
+        
+    def run(self):
+        try:
+            shutil.rmtree(self._project_path)
+            success, message = True, "项目删除成功"
+        except Exception as e:
+            success, message = False, f"删除项目失败: {str(e)}"
+            print(message)
+        self._manager.project_deleted.emit(self._project_path, success, message)
+
 class ProjectManager(QObject):
     """项目管理器"""
     
@@ -21,9 +38,18 @@ class ProjectManager(QObject):
     project_opened = Signal(str)       # 项目打开信号，参数：项目路径
     project_saved = Signal(str)        # 项目保存信号，参数：项目路径
     project_closed = Signal()          # 项目关闭信号
+    project_deleted = Signal(str, bool, str)  # 项目删除完成信号 (项目路径, 是否成功, 消息)
     data_changed = Signal(str, str, str)  # 数据变更信号 (模块名, 数据ID, 操作类型)
     sync_update = Signal(str, dict)    # 同步更新信号 (目标模块, 更新数据)
     
+    # 模块名 -> (数据ID属性, DatabaseManager的批量添加方法)
+    _BATCH_ADD = {
+        'material_params': ('material_id', 'add_materials_many'),
+        'process_materials': ('stream_id', 'add_process_materials_many'),
+        'process_flow': ('unit_id', 'add_process_units_many'),
+        'equipment_list': ('equipment_id', 'add_equipment_many'),
+    }
+    
     def __init__(self):
         super().__init__()
         self.current_project_path = None
@@ -32,6 +58,13 @@ class ProjectManager(QObject):
         self.data_sync = None
         self.project_info = None
         self.auto_save_timer = None
+        # 项目列表缓存：配置文件路径 -> (修改时间ns, 项目条目)；无效的配置文件条目为None
+        self._project_list_cache: Dict[str, Tuple[int, Optional[Dict[str, Any]]]] = {}
+        # 数据修改计数：与上次保存/备份时的计数相同说明其后没有修改，
+        # 自动保存跳过保存，保存项目时跳过备份（None表示本次打开后尚未备份）
+        self._data_version = 0
+        self._saved_version = 0
+        self._backup_version: Optional[int] = None
         
         # 项目配置
         self.config = {
@@ -63,7 +96,7 @@ class ProjectManager(QObject):
             # 创建子目录
             subdirs = ['backups', 'exports', 'reports', 'attachments']
             for subdir in subdirs:
-                os.makedirs(os.path.join(project_dir, subdir), exist_ok=True)
+                ensure_dir(os.path.join(project_dir, subdir))
                 
             # 创建项目数据库
             db_path = os.path.join(project_dir, f"{name}.db")
@@ -97,12 +130,13 @@ class ProjectManager(QObject):
             }
             
             config_path = os.path.join(project_dir, 'project_config.json')
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, indent=2, ensure_ascii=False)
+            with open(config_path, 'wb') as f:
+                f.write(fast_json.dumps_bytes(config_data, indent=True))
                 
             # 设置当前项目
             self.current_project_path = project_dir
             self.current_project_name = name
+            self._reset_data_version()
             
             # 初始化数据同步引擎
             self.data_sync = DataSyncEngine(self.db_manager)
@@ -127,12 +161,14 @@ class ProjectManager(QObject):
         if self.data_sync:
             try:
                 self.data_sync.sync_completed.connect(self._on_sync_completed)
-                self.data_sync.calculation_completed.connect(self._on_calculation_completed)
+                self.data_sync.calculations_completed.connect(self._on_calculations_completed)
             except RuntimeError:
                 print("连接数据同步信号失败（可能已连接）")
             
     def open_project(self, project_path: str) -> Tuple[bool, str]:
         try:
+            create_directories()
+            
             # 检查路径类型
             if project_path.endswith('.json'):
                 # 项目配置文件
@@ -148,8 +184,8 @@ class ProjectManager(QObject):
                 return False, "项目配置文件不存在"
                 
             # 读取项目配置
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+            with open(config_path, 'rb') as f:
+                config_data = fast_json.loads(f.read())
                 
             # 验证数据库文件
             db_path = config_data.get('db_path')
@@ -164,6 +200,9 @@ class ProjectManager(QObject):
             # 连接到数据库
             self.db_manager = DatabaseManager(db_path)
             
+            # 确保旧项目数据库包含最新的表结构（建表语句均为IF NOT EXISTS）
+            self.db_manager.initialize_database()
+            
             # 获取项目信息
             self.project_info = self.db_manager.get_project_info()
             if not self.project_info:
@@ -180,12 +219,13 @@ class ProjectManager(QObject):
                 
             # 更新修改时间
             config_data['modified_date'] = datetime.now().isoformat()
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, indent=2, ensure_ascii=False)
+            with open(config_path, 'wb') as f:
+                f.write(fast_json.dumps_bytes(config_data, indent=True))
                 
             # 设置当前项目
             self.current_project_path = project_dir
             self.current_project_name = config_data.get('name')
+            self._reset_data_version()
             
             # 初始化数据同步引擎
             self.data_sync = DataSyncEngine(self.db_manager)
@@ -210,6 +250,10 @@ class ProjectManager(QObject):
             return False, "没有打开的项目"
             
         try:
+            # 处理尚未提交的同步请求
+            if self.data_sync:
+                self.data_sync.flush()
+                
             # 更新项目信息
             if self.project_info:
                 self.project_info.modified_date = datetime.now().isoformat()
@@ -218,18 +262,20 @@ class ProjectManager(QObject):
             # 更新项目配置文件
             config_path = os.path.join(self.current_project_path, 'project_config.json')
             if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
+                with open(config_path, 'rb') as f:
+                    config_data = fast_json.loads(f.read())
                     
                 config_data['modified_date'] = datetime.now().isoformat()
                 
-                with open(config_path, 'w', encoding='utf-8') as f:
-                    json.dump(config_data, f, indent=2, ensure_ascii=False)
+                with open(config_path, 'wb') as f:
+                    f.write(fast_json.dumps_bytes(config_data, indent=True))
                     
-            # 创建备份
-            if backup:
-                self._create_backup()
-                
+            # 创建备份（上次备份后数据没有修改时不再重复备份相同的内容）
+            if backup and self._backup_version != self._data_version:
+                if self._create_backup():
+                    self._backup_version = self._data_version
+                    
+            self._saved_version = self._data_version
             print(f"项目保存成功: {self.current_project_path}")
             self.project_saved.emit(self.current_project_path)
             return True, "项目保存成功"
@@ -245,6 +291,10 @@ class ProjectManager(QObject):
             # 停止自动保存
             self._stop_auto_save()
             
+            # 处理尚未提交的同步请求
+            if self.data_sync:
+                self.data_sync.flush()
+                
             # 断开信号连接
             self._disconnect_signals()
             
@@ -268,6 +318,12 @@ class ProjectManager(QObject):
             return False
             
     def delete_project(self, project_path: str) -> Tuple[bool, str]:
+        """
+        删除项目目录
+        
+        检查在调用线程中完成，目录在后台线程中删除（大项目目录不阻塞界面），
+        删除完成后发出 project_deleted 信号；返回值只表示删除是否已开始。
+        """
         try:
             # 安全检查
             if not os.path.exists(project_path):
@@ -279,8 +335,10 @@ class ProjectManager(QObject):
                 return False, "不能删除当前打开的项目"
                 
             # 删除项目目录
-            shutil.rmtree(project_path)
-            return True, "项目删除成功"
+            forget_dirs(project_path)
+            self._project_list_cache.pop(os.path.join(project_path, 'project_config.json'), None)
+            QThreadPool.globalInstance().start(_DeleteProjectTask(self, project_path))
+            return True, "正在删除项目"
             
         except Exception as e:
             error_msg = f"删除项目失败: {str(e)}"
@@ -314,6 +372,9 @@ class ProjectManager(QObject):
                 data_id = data.equipment_id
                 success = self.db_manager.add_equipment(data)
                 
+            if success:
+                self._data_version += 1
+                
             if success and data_id and self.data_sync:
                 # 触发数据同步
                 data_dict = data.to_dict() if hasattr(data, 'to_dict') else data
@@ -328,6 +389,41 @@ class ProjectManager(QObject):
             print(error_msg)
             return False, error_msg
             
+    def add_data_batch(self, module: str, items: List[Any]) -> Tuple[bool, str]:
+        """
+        批量添加数据到指定模块
+        
+        整批数据在一个事务中用 executemany 写入（只提交一次），任一条失败则整批回滚；
+        写入成功后再逐条触发数据同步和数据变更信号。
+        """
+        if not self.db_manager:
+            return False, "数据库未连接"
+        if module not in self._BATCH_ADD:
+            return False, "不支持的模块"
+            
+        id_attr, method_name = self._BATCH_ADD[module]
+        if not all(hasattr(item, id_attr) for item in items):
+            return False, "数据格式错误"
+        if not items:
+            return True, f"{module}没有需要添加的数据"
+            
+        try:
+            if not getattr(self.db_manager, method_name)(items):
+                return False, "批量添加失败"
+            self._data_version += 1
+            
+            for item in items:
+                data_id = getattr(item, id_attr)
+                if self.data_sync:
+                    self.data_sync.sync_data(module, 'add', data_id, item.to_dict())
+                self.data_changed.emit(module, data_id, 'add')
+            return True, f"{module}批量添加成功: {len(items)}条"
+            
+        except Exception as e:
+            error_msg = f"批量添加数据失败: {str(e)}"
+            print(error_msg)
+            return False, error_msg
+            
     def calculate_all_balances(self) -> Tuple[bool, str]:
         """计算所有平衡"""
         if not self.data_sync:
@@ -381,6 +477,7 @@ class ProjectManager(QObject):
                 data_id = data.material_id
                 success = self.db_manager.update_material(data)
                 if success:
+                    self._data_version += 1
                     self.data_changed.emit(module, data_id, 'update')
                     # 触发数据同步
                     if self.data_sync:
@@ -407,6 +504,7 @@ class ProjectManager(QObject):
             if module == 'material_params':
                 success = self.db_manager.delete_material(data_id)
                 if success:
+                    self._data_version += 1
                     self.data_changed.emit(module, data_id, 'delete')
                     # 触发数据同步
                     if self.data_sync:
@@ -424,6 +522,26 @@ class ProjectManager(QObject):
             
     # ========== 项目工具方法 ==========
     
+    def restore_database(self, backup_path: str) -> Tuple[bool, str]:
+        """从备份文件恢复当前项目的数据库"""
+        if not self.db_manager:
+            return False, "数据库未连接"
+            
+        try:
+            if not self.db_manager.restore_database(backup_path):
+                return False, "恢复备份失败"
+                
+            # 数据库内容已整体替换，同步引擎缓存的物料、依赖和计算结果均已失效
+            if self.data_sync:
+                self.data_sync.invalidate_caches()
+            self._data_version += 1
+            return True, "恢复备份成功"
+            
+        except Exception as e:
+            error_msg = f"恢复备份失败: {str(e)}"
+            print(error_msg)
+            return False, error_msg
+    
     def export_project(self, export_path: str, format: str = 'json') -> Tuple[bool, str]:
         if not self.db_manager:
             return False, "数据库未连接"
@@ -435,6 +553,13 @@ class ProjectManager(QObject):
                     return True, "项目导出成功"
                 else:
                     return False, "项目导出失败"
+            elif format == 'sql':
+                # SQL脚本用于备份/恢复，JSON用于与外部交换数据
+                success = self.db_manager.backup_to_sql(export_path)
+                if success:
+                    return True, "项目导出成功"
+                else:
+                    return False, "项目导出失败"
             else:
                 return False, "不支持的导出格式"
                 
@@ -453,9 +578,16 @@ class ProjectManager(QObject):
                 # TODO: 实现模块数据导入
                 return False, "模块数据导入功能暂未实现"
             else:
-                # 导入整个项目
-                success = self.db_manager.import_from_json(import_path)
+                # 导入整个项目（.sql为 export_project(format='sql') 导出的SQL脚本）
+                if import_path.lower().endswith('.sql'):
+                    success = self.db_manager.restore_from_sql(import_path)
+                else:
+                    success = self.db_manager.import_from_json(import_path)
                 if success:
+                    # 数据库内容已整体替换，同步引擎缓存的物料、依赖和计算结果均已失效
+                    if self.data_sync:
+                        self.data_sync.invalidate_caches()
+                    self._data_version += 1
                     return True, "项目导入成功"
                 else:
                     return False, "项目导入失败"
@@ -470,31 +602,47 @@ class ProjectManager(QObject):
             search_path = DB_CONFIG['default_path']
             
         projects = []
+        cache = self._project_list_cache
         
         try:
             if os.path.exists(search_path):
-                for item in os.listdir(search_path):
-                    item_path = os.path.join(search_path, item)
-                    if os.path.isdir(item_path):
-                        config_path = os.path.join(item_path, 'project_config.json')
-                        if os.path.exists(config_path):
+                # scandir的目录项自带类型信息，判断子目录不需要额外的stat
+                with os.scandir(search_path) as entries:
+                    for item in entries:
+                        if not item.is_dir():
+                            continue
+                        config_path = os.path.join(item.path, 'project_config.json')
+                        try:
+                            mtime_ns = os.stat(config_path).st_mtime_ns
+                        except OSError:
+                            continue
+                            
+                        # 配置文件未修改时直接使用上次解析的结果
+                        cached = cache.get(config_path)
+                        if cached is not None and cached[0] == mtime_ns:
+                            project = cached[1]
+                        else:
                             try:
-                                with open(config_path, 'r', encoding='utf-8') as f:
-                                    config_data = json.load(f)
+                                with open(config_path, 'rb') as f:
+                                    config_data = fast_json.loads(f.read())
                                     
-                                projects.append({
-                                    'name': config_data.get('name', item),
-                                    'path': item_path,
+                                project = {
+                                    'name': config_data.get('name', item.name),
+                                    'path': item.path,
                                     'description': config_data.get('description', ''),
                                     'author': config_data.get('author', ''),
                                     'created_date': config_data.get('created_date', ''),
                                     'modified_date': config_data.get('modified_date', ''),
                                     'config_path': config_path
-                                })
+                                }
                             except:
                                 # 跳过无效的配置文件
-                                pass
-                                
+                                project = None
+                            cache[config_path] = (mtime_ns, project)
+                            
+                        if project is not None:
+                            projects.append(dict(project))
+                            
             return sorted(projects, key=lambda x: x.get('modified_date', ''), reverse=True)
             
         except Exception as e:
@@ -509,14 +657,11 @@ class ProjectManager(QObject):
     # ========== 内部方法 ==========
     
     def _connect_signals(self):
-        """连接信号"""
+        """连接信号（打开项目时新建的同步引擎尚无连接，不会重复连接）"""
+        self._connect_sync_signals()
         if self.data_sync:
             try:
-                # 使用新的连接方法，避免重复连接
-                if not self.data_sync.sync_completed.hasConnection():
-                    self.data_sync.sync_completed.connect(self._on_sync_completed)
-                if not self.data_sync.data_updated.hasConnection():
-                    self.data_sync.data_updated.connect(self._on_data_updated)
+                self.data_sync.data_updated.connect(self._on_data_updated)
             except Exception as e:
                 print(f"连接信号失败: {e}")
             
@@ -535,7 +680,7 @@ class ProjectManager(QObject):
                 
             # 断开计算完成信号
             try:
-                self.data_sync.calculation_completed.disconnect()
+                self.data_sync.calculations_completed.disconnect()
             except (TypeError, RuntimeError):
                 pass
                 
@@ -553,19 +698,30 @@ class ProjectManager(QObject):
             self.auto_save_timer = None
             
     def _auto_save(self):
-        """自动保存"""
-        if self.current_project_path and self.db_manager:
+        """自动保存（上次保存后没有修改时跳过，不重复创建相同的备份）"""
+        if self.current_project_path and self.db_manager and self._dirty:
             print("自动保存项目...")
             self.save_project(backup=True)
             
-    def _create_backup(self):
-        """创建备份"""
+    def _reset_data_version(self):
+        """重置数据修改计数（创建或打开项目后调用；打开后的首次保存总会备份）"""
+        self._data_version = 0
+        self._saved_version = 0
+        self._backup_version = None
+        
+    @property
+    def _dirty(self) -> bool:
+        """上次保存后数据是否有修改"""
+        return self._data_version != self._saved_version
+        
+    def _create_backup(self) -> bool:
+        """创建备份，返回是否成功"""
         try:
-            if not self.current_project_path:
-                return
+            if not self.current_project_path or not self.db_manager:
+                return False
                 
             backup_dir = os.path.join(self.current_project_path, 'backups')
-            os.makedirs(backup_dir, exist_ok=True)
+            ensure_dir(backup_dir)
             
             # 生成备份文件名
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -573,14 +729,16 @@ class ProjectManager(QObject):
             backup_path = os.path.join(backup_dir, backup_name)
             
             # 备份数据库
-            if self.db_manager:
-                self.db_manager.backup_database(backup_path)
+            if not self.db_manager.backup_database(backup_path):
+                return False
                 
             # 清理旧的备份文件
             self._cleanup_old_backups(backup_dir)
+            return True
             
         except Exception as e:
             print(f"创建备份失败: {e}")
+            return False
             
     def _cleanup_old_backups(self, backup_dir: str):
         """清理旧的备份文件"""
@@ -614,15 +772,23 @@ class ProjectManager(QObject):
     def _on_sync_completed(self, sync_type: str, success: bool, message: str):
         """同步完成处理"""
         if success:
-            self._log_message(f"数据同步完成: {sync_type}")
+            print(f"数据同步完成: {sync_type}")
         else:
-            self._log_message(f"数据同步失败: {sync_type} - {message}")
-            
-    def _on_calculation_completed(self, calc_type: str, results: Dict[str, Any]):
-        """计算完成处理"""
-        self._log_message(f"{calc_type}计算完成: {results.get('unit_id', 'unknown')}")
-        # 发出数据变更信号，通知UI更新
-        self.data_changed.emit(calc_type, results.get('unit_id', ''), 'calculated')
+            print(f"数据同步失败: {sync_type} - {message}")
+            
+    def _on_calculations_completed(self, calculations: List[Tuple[str, Dict[str, Any]]]):
+        """计算完成处理（每次同步提交后收到一批计算结果）"""
+        # 计算结果已写入数据库
+        self._data_version += 1
+        units_by_type: Dict[str, List[str]] = {}
+        for calc_type, results in calculations:
+            units_by_type.setdefault(calc_type, []).append(results.get('unit_id', 'unknown'))
+            
+        for calc_type, unit_ids in units_by_type.items():
+            print(f"{calc_type}计算完成: {', '.join(unit_ids)}")
+            # 每类平衡只发出一次数据变更信号，通知UI更新
+            data_id = unit_ids[0] if len(unit_ids) == 1 else ''
+            self.data_changed.emit(calc_type, data_id, 'calculated')
             
     def _on_data_updated(self, module: str, data_id: str):
         """数据更新处理"""
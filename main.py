@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import logging
 from pathlib import Path
 
 # 添加项目根目录到Python路径
@@ -14,6 +15,12 @@ from ui.main_window import MainWindow
 
 def main():
     """主函数"""
+    # 日志默认INFO级别，同步引擎的逐单元DEBUG日志不输出
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+    
     # 创建Qt应用
     app = QApplication(sys.argv)
     